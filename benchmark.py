@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import psutil
+from src.config import ScraperConfig
+from src.scraper import AmazonScraper
+from src.replay import ReplayServer
+
+
+class PeakRSSSampler:
+    """Sample the RSS of this process and its children (the browsers) in the background"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            with contextlib.suppress(psutil.Error):
+                total += child.memory_info().rss
+        return total
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self._sample())
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def build_config(args, concurrency: int, base_url: str, output_root: str) -> ScraperConfig:
+    config = ScraperConfig()
+    config.keywords = [f"bench{i}" for i in range(args.keywords)]
+    config.base_url = base_url
+    config.output_folder = os.path.join(output_root, f"concurrency_{concurrency}")
+    config.downloads_path = os.path.join(config.output_folder, "downloads")
+    config.cache_path = os.path.join(config.output_folder, "page_cache.db")
+    # Every level fetches the same URLs; crawl4ai's cache would serve all but the first
+    config.browser_cache_mode = "bypass"
+    config.max_concurrent_requests = concurrency
+    config.enable_adaptive_concurrency = False  # Measure each level as configured
+    config.browser_pool_size = concurrency
+    config.requests_per_second = args.rate
+    config.rate_limit_burst = concurrency
+    config.retry_delay = 0
+    config.max_depth = args.pages
+    config.enable_logging = False
+    config.enable_proxy_rotation = False
+    config.enable_file_downloads = False
+    config.wait_for_images = False
+    config.wait_for_downloads = 0
+    config.metrics_snapshot_interval = 0
+    return config
+
+
+async def run_once(config: ScraperConfig) -> dict:
+    scraper = AmazonScraper(config)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await scraper.scrape_amazon()
+    elapsed = time.perf_counter() - started
+    metrics = scraper.metrics
+    latencies = metrics.stages.get("fetch")
+    return {
+        "pages": metrics.successful_requests,
+        "products": metrics.total_products,
+        "captchas": metrics.captchas_encountered,
+        "elapsed": elapsed,
+        "pages_per_second": metrics.successful_requests / elapsed if elapsed else 0,
+        "products_per_second": metrics.total_products / elapsed if elapsed else 0,
+        "latency_p50": latencies.quantile(0.5),
+        "latency_p99": latencies.quantile(0.99),
+        "latency_mean": latencies.mean(),
+        "stages": metrics.stages.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scraper end to end against a local replay server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--keywords", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=5, help="Result pages per keyword")
+    parser.add_argument("--products", type=int, default=20, help="Products per page")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Artificial server latency in seconds")
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="Requests per second per proxy")
+    parser.add_argument("--recordings", help="Replay HTML recorded with record_html_path")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_root, ReplayServer(
+            recordings_path=args.recordings, pages_per_keyword=args.pages,
+            products_per_page=args.products, captcha_rate=args.captcha_rate,
+            latency=args.latency) as server:
+        for concurrency in args.concurrency:
+            config = build_config(args, concurrency, server.base_url, output_root)
+            with PeakRSSSampler() as sampler:
+                result = asyncio.run(run_once(config))
+            result.update(concurrency=concurrency, peak_rss_mb=sampler.peak / (1024 * 1024))
+            results.append(result)
+
+    print(f"{'conc':>5} {'pages':>6} {'pages/s':>9} {'prod/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'captchas':>9} {'peak RSS MB':>12}")
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['pages']:>6} {r['pages_per_second']:>9.2f} "
+              f"{r['products_per_second']:>9.1f} {r['latency_p50'] * 1000:>8.1f} "
+              f"{r['latency_p99'] * 1000:>8.1f} {r['captchas']:>9} {r['peak_rss_mb']:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,99 @@
+import argparse
 import asyncio
+import os
 from src.config import ScraperConfig
+from src.database import Database
 from src.scraper import AmazonScraper
+from src.sharding import ShardedScraper
+from src.query import ProductQuery, QueryServer
+from src.warehouse import Warehouse
 
 
-async def main():
+async def main(config: ScraperConfig):
     """Main entry point for the Amazon scraper"""
-    config = ScraperConfig()
     scraper = AmazonScraper(config)
     await scraper.scrape_amazon()
 
+
+def serve(db_path: str, host: str, port: int):
+    """Serve search queries over a products database until interrupted"""
+    with ProductQuery(db_path) as query:
+        print(f"🔎 Serving {db_path} on http://{host}:{port}/products")
+        try:
+            QueryServer(query, host, port).serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def migrate(db_path: str):
+    """Bring a products database written by an older version up to the current schema"""
+    Database(db_path).create_tables()
+    print(f"🛠️  Migrated {db_path}")
+
+
+def consolidate(config: ScraperConfig, results_folder: str):
+    """Merge new runs into the warehouse and apply its compaction and retention policies"""
+    with Warehouse(config.warehouse_path) as warehouse:
+        reports = warehouse.merge_results(results_folder)
+        for report in reports:
+            print(f"📥 {report['run_id']}: {report['products']} products, "
+                  f"{report['changed']} new or changed")
+        maintenance = warehouse.maintain(config.warehouse_compact_after_days,
+                                         config.warehouse_retention_days,
+                                         config.warehouse_full_vacuum)
+    print(f"🏛️  Merged {len(reports)} runs into {config.warehouse_path} "
+          f"({maintenance['compacted']} versions compacted, "
+          f"{maintenance['expired']} rows expired)")
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Amazon product scraper")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Split keywords across this many worker processes")
+    parser.add_argument("--keywords-file", metavar="PATH",
+                        help="Read keywords from this file, one per line")
+    parser.add_argument("--resume", metavar="RUN_DIR",
+                        help="Continue an interrupted run from its journal")
+    parser.add_argument("--serve", metavar="DB_PATH",
+                        help="Serve search queries over a products database instead of scraping")
+    parser.add_argument("--migrate", metavar="DB_PATH",
+                        help="Add the numeric columns and search index to a products database "
+                             "written by an older version")
+    parser.add_argument("--consolidate", metavar="RESULTS_DIR", nargs="?", const="./Results",
+                        help="Merge the runs in a results folder into the warehouse instead "
+                             "of scraping")
+    parser.add_argument("--host", default="127.0.0.1", help="Address of the query server")
+    parser.add_argument("--port", type=int, default=8080, help="Port of the query server")
+    args = parser.parse_args()
+
+    if args.migrate:
+        if not os.path.isfile(args.migrate):
+            parser.error(f"database not found: {args.migrate}")
+        migrate(args.migrate)
+        parser.exit()
+    if args.serve:
+        if not os.path.isfile(args.serve):
+            parser.error(f"database not found: {args.serve}")
+        try:
+            serve(args.serve, args.host, args.port)
+        except ValueError as e:
+            parser.error(str(e))
+        parser.exit()
+
+    config = ScraperConfig()
+    if args.consolidate:
+        if not os.path.isdir(args.consolidate):
+            parser.error(f"results directory not found: {args.consolidate}")
+        consolidate(config, args.consolidate)
+        parser.exit()
+    if args.keywords_file:
+        config.keywords_file = args.keywords_file
+    if args.resume:
+        if not os.path.isdir(args.resume):
+            parser.error(f"run directory not found: {args.resume}")
+        config.output_folder = args.resume.rstrip("/\\")
+        config.downloads_path = os.path.join(config.output_folder, "downloads")
+        config.resume = True
+    if args.processes > 1:
+        ShardedScraper(config, args.processes).run()
+    else:
+        asyncio.run(main(config))
@@ -0,0 +1,294 @@
+import bisect
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional
+
+EXTENSIONS = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz", "none": ".jsonl"}
+
+
+class Codec:
+    """Compress and decompress independent frames of one archive"""
+
+    def __init__(self, name: str, level: Optional[int] = None, dictionary: bytes = None):
+        if name not in EXTENSIONS:
+            raise ValueError(f"Unknown codec: {name}")
+        self.name = name
+        self.extension = EXTENSIONS[name]
+        self.level = level
+        self.dictionary = None
+        if name == "zstd":
+            import zstandard
+            self.zstd = zstandard
+            if dictionary:
+                self.dictionary = zstandard.ZstdCompressionDict(dictionary)
+            self.compressor = zstandard.ZstdCompressor(
+                level=level or 3, dict_data=self.dictionary)
+            self.decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionary)
+
+    def set_dictionary(self, dictionary):
+        self.dictionary = dictionary
+        self.compressor = self.zstd.ZstdCompressor(level=self.level or 3, dict_data=dictionary)
+        self.decompressor = self.zstd.ZstdDecompressor(dict_data=dictionary)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == "zstd":
+            return self.compressor.compress(data)
+        if self.name == "gzip":
+            return gzip.compress(data, compresslevel=self.level or 6, mtime=0)
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.name == "zstd":
+            return self.decompressor.decompressobj().decompress(data)
+        if self.name == "gzip":
+            return gzip.decompress(data)
+        return data
+
+    def open_lines(self, path: str) -> io.TextIOBase:
+        """Open a whole segment as a stream of text lines"""
+        if self.name == "zstd":
+            return io.TextIOWrapper(self.decompressor.stream_reader(
+                open(path, "rb"), read_across_frames=True, closefd=True), encoding="utf-8")
+        if self.name == "gzip":
+            return gzip.open(path, "rt", encoding="utf-8")
+        return open(path, encoding="utf-8")
+
+
+def get_codec(name: str, level: Optional[int] = None) -> Codec:
+    """Create a codec, falling back to gzip when zstandard is not installed"""
+    try:
+        return Codec(name, level)
+    except ImportError:
+        logging.warning("zstandard is not installed, compressing archives with gzip")
+        return Codec("gzip", level)
+
+
+class RecordWriter:
+    """Append JSON records to rolling compressed segments with an offset index
+
+    Records are buffered into frames of about ``frame_size`` bytes; each
+    frame is compressed on its own (a zstd frame or a gzip member) and
+    appended to the current segment ``<base>-<n><ext>``. Standard tools
+    (``zstd -d``, ``zcat``) read the segments as one stream. A new segment
+    starts once one exceeds ``segment_max_bytes`` or is older than
+    ``segment_max_age`` seconds. Every frame is listed in
+    ``<base>.index.jsonl`` with its segment, byte range and first record
+    number, so readers can seek to a record without decompressing the rest.
+
+    With ``dictionary`` set (zstd only), a dictionary is trained on the
+    first ``dictionary_samples`` records and saved as ``<base>.dict``;
+    it mostly pays off with small frames. Reopening an archive continues
+    it in a new segment.
+    """
+
+    def __init__(self, base: str, codec: str = "zstd", level: Optional[int] = None,
+                 frame_size: int = 1024 * 1024, segment_max_bytes: int = 256 * 1024 * 1024,
+                 segment_max_age: float = 0, flush_interval: float = 5,
+                 dictionary: bool = False, dictionary_size: int = 64 * 1024,
+                 dictionary_samples: int = 500):
+        self.base = base
+        self.codec = get_codec(codec, level)
+        self.frame_size = frame_size
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.flush_interval = flush_interval
+        self.dictionary_size = dictionary_size
+        self.dictionary_samples = dictionary_samples
+        self.index_path = f"{base}.index.jsonl"
+        self.dictionary_path = f"{base}.dict"
+        self.training = dictionary and self.codec.name == "zstd"
+        if self.training and os.path.exists(self.dictionary_path):
+            with open(self.dictionary_path, "rb") as f:
+                self.codec.set_dictionary(self.codec.zstd.ZstdCompressionDict(f.read()))
+            self.training = False
+
+        self.buffer: List[bytes] = []
+        self.buffered_bytes = 0
+        self.buffered_since = 0.0
+        self.segment = None
+        self.segment_name = None
+        self.segment_started = 0.0
+        self.segment_number = 0
+        self.records = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.resume()
+        self.index = open(self.index_path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def resume(self):
+        """Continue numbering after the segments and records of an existing archive"""
+        for path in glob.glob(f"{glob.escape(self.base)}-*.jsonl*"):
+            match = re.search(r"-(\d+)\.jsonl", path[len(self.base):])
+            if match:
+                self.segment_number = max(self.segment_number, int(match.group(1)))
+        for frame in read_index(self.index_path):
+            self.records = max(self.records, frame["first"] + frame["records"])
+
+    def write(self, record: Dict):
+        data = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        if not self.buffer:
+            self.buffered_since = time.monotonic()
+        self.buffer.append(data)
+        self.buffered_bytes += len(data)
+        if self.training:
+            if len(self.buffer) >= self.dictionary_samples:
+                self.train_dictionary()
+            return
+        if self.buffered_bytes >= self.frame_size or \
+                time.monotonic() - self.buffered_since >= self.flush_interval:
+            self.flush()
+
+    def train_dictionary(self):
+        self.training = False
+        try:
+            dictionary = self.codec.zstd.train_dictionary(self.dictionary_size, self.buffer)
+        except self.codec.zstd.ZstdError as e:
+            logging.warning(f"Could not train a dictionary for {self.base}: {str(e)}")
+            return
+        with open(self.dictionary_path, "wb") as f:
+            f.write(dictionary.as_bytes())
+        self.codec.set_dictionary(dictionary)
+
+    def open_segment(self):
+        self.segment_number += 1
+        self.segment_name = (f"{os.path.basename(self.base)}-{self.segment_number:05d}"
+                             f"{self.codec.extension}")
+        self.segment = open(os.path.join(os.path.dirname(self.base), self.segment_name), "ab")
+        self.segment_started = time.monotonic()
+
+    def close_segment(self):
+        self.segment.close()
+        self.segment = None
+
+    def flush(self):
+        """Compress the buffered records into one frame and index it"""
+        if self.training:
+            self.train_dictionary()
+        if not self.buffer:
+            return
+        raw = b"".join(self.buffer)
+        frame = self.codec.compress(raw)
+        if self.segment is None:
+            self.open_segment()
+        offset = self.segment.tell()
+        self.segment.write(frame)
+        self.segment.flush()
+        self.index.write(json.dumps({
+            "segment": self.segment_name, "offset": offset, "length": len(frame),
+            "first": self.records, "records": len(self.buffer)}) + "\n")
+        self.index.flush()
+        self.records += len(self.buffer)
+        self.bytes_in += len(raw)
+        self.bytes_out += len(frame)
+        self.buffer.clear()
+        self.buffered_bytes = 0
+
+        if offset + len(frame) >= self.segment_max_bytes or (
+                self.segment_max_age and
+                time.monotonic() - self.segment_started >= self.segment_max_age):
+            self.close_segment()
+
+    def close(self):
+        self.flush()
+        if self.segment is not None:
+            self.close_segment()
+        self.index.close()
+
+
+def remove_archive(base: str):
+    """Delete the segments, index and dictionary of an existing archive"""
+    paths = [path for path in glob.glob(f"{glob.escape(base)}-*.jsonl*")
+             if re.fullmatch(r"-\d+\.jsonl.*", path[len(base):])]
+    for path in paths + [f"{base}.index.jsonl", f"{base}.dict"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_index(path: str) -> List[Dict]:
+    frames = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    frames.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Torn last line from a crash
+    return frames
+
+
+class RecordReader:
+    """Stream the records of an archive written by RecordWriter
+
+    Iteration decompresses one frame at a time, so memory use is bounded
+    by the frame size. ``get(n)`` decompresses only the frame holding
+    record ``n``. Archives without an index (or segments of plain gzip or
+    zstd JSON Lines) are streamed line by line.
+    """
+
+    def __init__(self, base: str):
+        self.base = base
+        self.folder = os.path.dirname(base)
+        self.frames = read_index(f"{base}.index.jsonl")
+        self.firsts = [frame["first"] for frame in self.frames]
+        dictionary = None
+        if os.path.exists(f"{base}.dict"):
+            with open(f"{base}.dict", "rb") as f:
+                dictionary = f.read()
+        self.codecs: Dict[str, Codec] = {}
+        self.dictionary = dictionary
+
+    def get_codec(self, segment: str) -> Codec:
+        name = next(name for name, extension in EXTENSIONS.items()
+                    if segment.endswith(extension))
+        codec = self.codecs.get(name)
+        if codec is None:
+            codec = self.codecs[name] = Codec(name, dictionary=self.dictionary)
+        return codec
+
+    def get_segments(self) -> List[str]:
+        return sorted(os.path.basename(path) for path in
+                      glob.glob(f"{glob.escape(self.base)}-*.jsonl*")
+                      if any(path.endswith(ext) for ext in EXTENSIONS.values()))
+
+    def __len__(self) -> int:
+        if self.frames:
+            return self.frames[-1]["first"] + self.frames[-1]["records"]
+        return sum(1 for _ in self)
+
+    def read_frame(self, frame: Dict) -> List[bytes]:
+        with open(os.path.join(self.folder, frame["segment"]), "rb") as f:
+            f.seek(frame["offset"])
+            data = f.read(frame["length"])
+        return self.get_codec(frame["segment"]).decompress(data).splitlines()
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self.frames:
+            for frame in self.frames:
+                for line in self.read_frame(frame):
+                    yield json.loads(line)
+            return
+        for segment in self.get_segments():
+            with self.get_codec(segment).open_lines(os.path.join(self.folder, segment)) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def get(self, n: int) -> Dict:
+        """Return record number ``n`` (0-based) using the index"""
+        i = bisect.bisect_right(self.firsts, n) - 1
+        if i < 0 or n >= self.frames[i]["first"] + self.frames[i]["records"]:
+            raise IndexError(n)
+        frame = self.frames[i]
+        return json.loads(self.read_frame(frame)[n - frame["first"]])
@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+import logging
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from crawl4ai import AsyncWebCrawler
+from crawl4ai.async_configs import BrowserConfig
+from .concurrency import ConcurrencyLimiter
+
+
+@dataclass
+class ProxyHealth:
+    """Health score of a proxy, kept as an exponential moving average of outcomes"""
+    proxy: Optional[str]
+    successes: int = 0
+    failures: int = 0
+    captchas: int = 0
+    score: float = 1.0
+
+    def record(self, outcome: str, alpha: float = 0.2):
+        if outcome == "success":
+            self.successes += 1
+        elif outcome == "captcha":
+            self.captchas += 1
+        else:
+            self.failures += 1
+        self.score = (1 - alpha) * self.score + alpha * (1.0 if outcome == "success" else 0.0)
+
+
+@dataclass
+class BrowserContext:
+    """A running crawler bound to one proxy and one user agent"""
+    id: int
+    crawler: AsyncWebCrawler
+    proxy: Optional[str]
+    user_agent: Optional[str]
+    consecutive_failures: int = 0
+    requests: int = 0
+
+
+class BrowserPool:
+    """Pool of crawlers, each with its own proxy and user agent, leased one request at a time
+
+    At most ``size`` contexts are leased at once; ``resize`` changes it while
+    contexts are leased, closing idle contexts beyond the new size as they
+    are returned. Retired contexts are not
+    replaced eagerly: the next lease starts a fresh one on the healthiest
+    proxy. With ``lazy`` set, no browser is launched until first needed.
+    Proxies for which ``is_available`` returns False (e.g. an open circuit
+    breaker) are avoided while any other proxy is available.
+    """
+
+    def __init__(self, make_config: Callable[[Optional[str], Optional[str]], BrowserConfig],
+                 proxies: List[Optional[str]], user_agents: List[Optional[str]],
+                 size: int = 3, max_failures: int = 3, retire_on_captcha: bool = True,
+                 lazy: bool = False,
+                 is_available: Optional[Callable[[Optional[str]], bool]] = None):
+        self.make_config = make_config
+        self.proxies = proxies or [None]
+        self.user_agents = user_agents or [None]
+        self.size = size
+        self.max_failures = max_failures
+        self.retire_on_captcha = retire_on_captcha
+        self.lazy = lazy
+        self.is_available = is_available
+        self.slots = ConcurrencyLimiter(size)
+        self.health: Dict[Optional[str], ProxyHealth] = {
+            proxy: ProxyHealth(proxy) for proxy in self.proxies}
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.in_use: Dict[Optional[str], int] = {proxy: 0 for proxy in self.proxies}
+        self.ids = itertools.count(1)
+        self.contexts_retired = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def choose_proxy(self) -> Optional[str]:
+        """Pick the healthiest proxy, preferring ones with fewer live contexts"""
+        proxies = self.proxies
+        if self.is_available:
+            proxies = [p for p in proxies if self.is_available(p)] or proxies
+        return max(proxies, key=lambda p: (
+            self.health[p].score - self.in_use[p], random.random()))
+
+    async def create_context(self) -> BrowserContext:
+        proxy = self.choose_proxy()
+        user_agent = random.choice(self.user_agents)
+        crawler = AsyncWebCrawler(config=self.make_config(proxy, user_agent))
+        await crawler.start()
+        self.in_use[proxy] += 1
+        context = BrowserContext(id=next(self.ids), crawler=crawler,
+                                 proxy=proxy, user_agent=user_agent)
+        logging.info(f"Started browser context {context.id} (proxy: {proxy})")
+        return context
+
+    async def start(self):
+        if not self.lazy:
+            for _ in range(self.size):
+                self.idle.put_nowait(await self.create_context())
+
+    def resize(self, size: int):
+        """Lease up to ``size`` contexts at once; new ones are started as they are needed"""
+        self.size = size
+        self.slots.set_limit(size)
+
+    async def acquire(self) -> BrowserContext:
+        await self.slots.acquire()
+        while not self.idle.empty():
+            context = self.idle.get_nowait()
+            if self.is_available is None or self.is_available(context.proxy):
+                return context
+            logging.info(f"Retiring browser context {context.id} "
+                         f"(proxy unavailable: {context.proxy})")
+            await self.retire(context)
+        try:
+            return await self.create_context()
+        except Exception:
+            self.slots.release()
+            raise
+
+    async def release(self, context: BrowserContext, outcome: str):
+        """Return a context after a request; retire it if it is being blocked"""
+        context.requests += 1
+        self.health[context.proxy].record(outcome)
+        if outcome == "success":
+            context.consecutive_failures = 0
+        else:
+            context.consecutive_failures += 1
+
+        try:
+            if (outcome == "captcha" and self.retire_on_captcha) or \
+                    context.consecutive_failures >= self.max_failures:
+                logging.warning(
+                    f"Retiring browser context {context.id} after {outcome} "
+                    f"(proxy: {context.proxy}, score: {self.health[context.proxy].score:.2f})")
+                await self.retire(context)
+            elif self.idle.qsize() >= self.size:
+                await self.close_context(context)  # The pool was shrunk
+            else:
+                self.idle.put_nowait(context)
+        finally:
+            self.slots.release()
+
+    async def retire(self, context: BrowserContext):
+        self.contexts_retired += 1
+        await self.close_context(context)
+
+    async def close_context(self, context: BrowserContext):
+        self.in_use[context.proxy] -= 1
+        try:
+            await context.crawler.close()
+        except Exception as e:
+            logging.error(f"Failed to close browser context {context.id}: {str(e)}")
+
+    async def close(self):
+        while not self.idle.empty():
+            context = self.idle.get_nowait()
+            self.in_use[context.proxy] -= 1
+            await context.crawler.close()
+
+    def get_health_report(self) -> Dict[str, Dict]:
+        return {str(h.proxy): {"score": round(h.score, 3), "successes": h.successes,
+                               "failures": h.failures, "captchas": h.captchas}
+                for h in self.health.values()}
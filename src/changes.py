@@ -0,0 +1,211 @@
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from .models import ScraperMetrics
+
+FINGERPRINT_FIELDS = ["title", "image", "price", "original_price", "rating",
+                      "reviews_count", "sponsored", "delivery_info"]
+HISTORY_FIELDS = ["price_value", "original_price_value", "rating_value",
+                  "reviews_count_value"]
+
+
+def get_fingerprint(product: Dict) -> str:
+    """Content fingerprint of a product, ignoring volatile fields such as tracking URLs"""
+    content = json.dumps([product.get(field) for field in FINGERPRINT_FIELDS],
+                         separators=(",", ":"), default=str)
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+def get_page_fingerprint(fingerprints: Iterable[str]) -> str:
+    """Fingerprint of a results page: the set of products it lists and their content"""
+    content = "\n".join(sorted(fingerprints))
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+@dataclass
+class PendingChanges:
+    """State updates of one page, committed only once its products are written"""
+    page: Optional[Tuple] = None  # (key, keyword, fingerprint, checked_at, changed)
+    products: List[Tuple] = field(default_factory=list)
+    history: List[Tuple] = field(default_factory=list)
+
+
+class ChangeTracker:
+    """Cross-run product fingerprints, price history and recrawl schedule stored in SQLite
+
+    Pages and products whose fingerprint matches the previous crawl are
+    reported as unchanged so they can be skipped at write time. Prices and
+    ratings are appended to ``price_history`` only when they differ from the
+    last stored values. Each keyword's recrawl interval halves when its pages
+    changed and doubles when they did not, within the configured bounds.
+
+    Fingerprints and history are staged in a ``PendingChanges`` and only
+    stored by ``commit``, once the page's products have been written, so a
+    page whose products were lost is not taken as unchanged next time.
+    """
+
+    def __init__(self, path: str, min_interval: float = 6 * 3600,
+                 max_interval: float = 7 * 24 * 3600,
+                 metrics: Optional[ScraperMetrics] = None):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.metrics = metrics
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=10000")  # Shared by shard processes
+        self.create_tables()
+
+    def create_tables(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS product_state (
+                    asin TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    price_value REAL,
+                    original_price_value REAL,
+                    rating_value REAL,
+                    reviews_count_value INTEGER,
+                    first_seen REAL,
+                    last_changed REAL
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS price_history (
+                    asin TEXT,
+                    observed_at REAL,
+                    price_value REAL,
+                    original_price_value REAL,
+                    rating_value REAL,
+                    reviews_count_value INTEGER
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_state (
+                    key TEXT PRIMARY KEY,
+                    keyword TEXT,
+                    fingerprint TEXT,
+                    last_checked REAL,
+                    last_changed REAL
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS keyword_schedule (
+                    keyword TEXT PRIMARY KEY,
+                    interval REAL,
+                    last_crawled REAL,
+                    last_changed REAL,
+                    crawls INTEGER DEFAULT 0,
+                    changes INTEGER DEFAULT 0
+                )""")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_price_history_asin "
+                "ON price_history(asin, observed_at)")
+            # Keywords crawled this run, kept on disk rather than in memory
+            self.conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS crawled_keywords (
+                    keyword TEXT PRIMARY KEY,
+                    changed INTEGER
+                )""")
+
+    def _count(self, field: str, amount: int = 1):
+        if self.metrics is not None:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
+
+    def check_page(self, key: str, keyword: str, products: List[Dict],
+                   pending: PendingChanges) -> bool:
+        """Stage a page's fingerprint, returning whether it changed since the last crawl"""
+        fingerprint = get_page_fingerprint(get_fingerprint(p) for p in products)
+        row = self.conn.execute(
+            "SELECT fingerprint FROM page_state WHERE key = ?", (key,)).fetchone()
+        changed = row is None or row[0] != fingerprint
+        pending.page = (key, keyword, fingerprint, time.time(), changed)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO crawled_keywords VALUES (?, ?) ON CONFLICT(keyword) "
+                "DO UPDATE SET changed = max(changed, excluded.changed)",
+                (keyword, int(changed)))
+        if not changed:
+            self._count("pages_unchanged")
+        return changed
+
+    def _load_state(self, asins: List[str]) -> Dict[str, Tuple]:
+        state = {}
+        for i in range(0, len(asins), 500):
+            chunk = asins[i:i + 500]
+            state.update((row[0], row[1:]) for row in self.conn.execute(
+                f"SELECT asin, fingerprint, {', '.join(HISTORY_FIELDS)} FROM product_state "
+                f"WHERE asin IN ({', '.join('?' for _ in chunk)})", chunk))
+        return state
+
+    def filter_changed(self, products: List[Dict], pending: PendingChanges) -> List[Dict]:
+        """Return the new and changed products of a normalized batch, staging their state"""
+        tracked = {p["asin"]: p for p in products if p.get("asin")}
+        state = self._load_state(list(tracked))
+        now = time.time()
+        changed, upserts, history = [], pending.products, pending.history
+        for product in products:
+            asin = product.get("asin")
+            if not asin or tracked[asin] is not product:
+                changed.append(product)  # Untracked or repeated on the same page
+                continue
+            fingerprint = get_fingerprint(product)
+            values = tuple(product.get(field) for field in HISTORY_FIELDS)
+            previous = state.get(asin)
+            if previous and previous[0] == fingerprint:
+                continue
+            changed.append(product)
+            upserts.append((asin, fingerprint, *values, now, now))
+            if previous is None or tuple(previous[1:]) != values:
+                history.append((asin, now, *values))
+
+        self._count("products_unchanged", len(products) - len(changed))
+        return changed
+
+    def commit(self, pending: PendingChanges):
+        """Store the staged state of a page whose products were written"""
+        with self.conn:
+            if pending.page:
+                key, keyword, fingerprint, checked_at, changed = pending.page
+                if changed:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO page_state VALUES (?, ?, ?, ?, ?)",
+                        (key, keyword, fingerprint, checked_at, checked_at))
+                else:
+                    self.conn.execute("UPDATE page_state SET last_checked = ? WHERE key = ?",
+                                      (checked_at, key))
+            self.conn.executemany(
+                "INSERT INTO product_state VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(asin) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                + ", ".join(f"{field} = excluded.{field}" for field in HISTORY_FIELDS)
+                + ", last_changed = excluded.last_changed", pending.products)
+            self.conn.executemany(
+                "INSERT INTO price_history VALUES (?, ?, ?, ?, ?, ?)", pending.history)
+
+    def is_due(self, keyword: str) -> bool:
+        """Whether a keyword was never crawled before or its recrawl interval has elapsed"""
+        row = self.conn.execute(
+            "SELECT last_crawled + interval FROM keyword_schedule WHERE keyword = ?",
+            (keyword,)).fetchone()
+        return row is None or row[0] <= time.time()
+
+    def update_schedule(self):
+        """Shorten the interval of keywords that changed this run and lengthen the rest"""
+        params = {"now": time.time(), "min": self.min_interval, "max": self.max_interval}
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO keyword_schedule SELECT c.keyword, CASE "
+                "WHEN s.interval IS NULL THEN :min "
+                "WHEN c.changed THEN max(:min, s.interval / 2) "
+                "ELSE min(:max, s.interval * 2) END, :now, "
+                "CASE WHEN s.interval IS NULL OR c.changed THEN :now ELSE s.last_changed END, "
+                "1, c.changed FROM crawled_keywords c "
+                "LEFT JOIN keyword_schedule s ON s.keyword = c.keyword WHERE true "
+                "ON CONFLICT(keyword) DO UPDATE SET interval = excluded.interval, "
+                "last_crawled = excluded.last_crawled, last_changed = excluded.last_changed, "
+                "crawls = crawls + 1, changes = changes + excluded.changes", params)
+            self.conn.execute("DELETE FROM crawled_keywords")
+
+    def close(self):
+        self.conn.close()
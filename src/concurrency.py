@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Deque, List, Optional
+from .models import ScraperMetrics
+from .retry import FetchError, CaptchaError, HttpError
+from .utils import RateLimiter
+
+THROTTLE_STATUS = {429, 503}
+
+
+class ConcurrencyLimiter:
+    """Semaphore whose limit can be changed while it is held
+
+    Waiters are served in arrival order. Lowering the limit never
+    interrupts requests in flight; new ones wait until enough have
+    finished. ``peak`` is the highest number in flight since it was
+    last reset, which tells whether the limit was actually reached.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self.waiters:
+            self._grant()
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # Granted just as the caller was cancelled
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+
+    def _grant(self):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    def _wake(self):
+        while self.waiters and self.in_flight < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self._grant()
+                waiter.set_result(None)
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def set_limit(self, limit: int):
+        self.limit = limit
+        self._wake()
+
+
+class AIMDController:
+    """Resize the concurrency limit and per-proxy rate from the outcomes of requests
+
+    Requests finished in each ``interval`` are judged together (once at
+    least ``min_samples`` have finished):
+
+    - CAPTCHAs or 429/503 responses above their thresholds mean the site is
+      pushing back, so the concurrency limit and the rate are both
+      multiplied by ``decrease``
+    - other errors above ``error_threshold``, or a median latency more than
+      ``latency_tolerance`` times the baseline (requests queueing at the
+      proxies or the site), only cut the concurrency limit
+    - otherwise, if requests had to wait for the rate limiter, the rate
+      grows by ``rate_step``; if not and the concurrency limit was reached,
+      the limit grows by one. Callers wait for the rate while holding a
+      slot, so the rate is raised before the concurrency
+
+    The baseline is the lowest window median seen, drifting slowly towards
+    newer medians so it follows lasting changes in the proxies.
+    """
+
+    def __init__(self, limiter: ConcurrencyLimiter, rate_limiter: RateLimiter,
+                 min_limit: int = 1, max_limit: int = 32, min_rate: float = 0.2,
+                 max_rate: float = 10.0, rate_step: float = 0.1, decrease: float = 0.5,
+                 interval: float = 5.0, min_samples: int = 5, latency_tolerance: float = 2.0,
+                 error_threshold: float = 0.1, captcha_threshold: float = 0.02,
+                 metrics: Optional[ScraperMetrics] = None, gauge_prefix: str = ""):
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.decrease = decrease
+        self.interval = interval
+        self.min_samples = min_samples
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.captcha_threshold = captcha_threshold
+        self.metrics = metrics
+        self.gauge_prefix = gauge_prefix  # Names the stage in the limit gauges
+        self.baseline: Optional[float] = None
+        self.decreased_at = 0.0
+        self.window_started = time.monotonic()
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.throttled = 0
+        self.captchas = 0
+        self.delayed = rate_limiter.delayed
+        self.limiter.set_limit(max(min_limit, min(self.limiter.limit, max_limit)))
+        self.rate_limiter.set_rate(
+            max(min_rate, min(self.rate_limiter.requests_per_second, max_rate)))
+        self._update_gauges()
+
+    def _count(self, field: str, amount: int = 1):
+        if self.metrics is not None:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
+
+    def _update_gauges(self):
+        if self.metrics is not None:
+            setattr(self.metrics, f"{self.gauge_prefix}concurrency_limit", self.limiter.limit)
+            setattr(self.metrics, f"{self.gauge_prefix}rate_limit",
+                    round(self.rate_limiter.requests_per_second, 3))
+
+    def record(self, seconds: float, error: Optional[FetchError] = None):
+        """Record one finished request: its latency and classified error, if any"""
+        if time.monotonic() - seconds < self.decreased_at:
+            return  # Started before the last cut, so it says nothing about the new limits
+        if isinstance(error, CaptchaError):
+            self.captchas += 1
+        elif isinstance(error, HttpError) and error.status in THROTTLE_STATUS:
+            self.throttled += 1
+        elif error is not None:
+            self.errors += 1
+        else:
+            self.latencies.append(seconds)
+
+        samples = len(self.latencies) + self.errors + self.throttled + self.captchas
+        if samples >= self.min_samples and \
+                time.monotonic() - self.window_started >= self.interval:
+            self.adjust(samples)
+
+    def adjust(self, samples: int):
+        limit = self.limiter.limit
+        rate = self.rate_limiter.requests_per_second
+        latency = statistics.median(self.latencies) if self.latencies else None
+        if latency is not None:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += 0.01 * (latency - self.baseline)
+
+        if self.captchas / samples > self.captcha_threshold or \
+                self.throttled / samples > self.error_threshold:
+            reason = "site pushing back"
+            limit = int(limit * self.decrease)
+            rate *= self.decrease
+        elif self.errors / samples > self.error_threshold:
+            reason = "errors"
+            limit = int(limit * self.decrease)
+        elif latency is not None and latency > self.baseline * self.latency_tolerance:
+            reason = "latency"
+            limit = int(limit * self.decrease)
+        else:
+            reason = None
+            if self.rate_limiter.delayed > self.delayed and rate < self.max_rate:
+                rate += self.rate_step
+            elif self.limiter.peak >= self.limiter.limit:
+                limit += 1
+
+        limit = max(self.min_limit, min(limit, self.max_limit))
+        rate = max(self.min_rate, min(rate, self.max_rate))
+        if limit < self.limiter.limit:
+            self._count("limit_decreases")
+        elif limit > self.limiter.limit:
+            self._count("limit_increases")
+        if reason:
+            self.decreased_at = time.monotonic()
+            logging.info(f"Lowering {self.gauge_prefix}concurrency to {limit} and rate to "
+                         f"{rate:.2f}/s ({reason}: {samples} requests, {self.errors} errors, {self.throttled} throttled, "
+                         f"{self.captchas} CAPTCHAs, median latency "
+                         f"{latency or 0:.2f}s vs {self.baseline or 0:.2f}s)")
+        self.limiter.set_limit(limit)
+        self.rate_limiter.set_rate(rate)
+        self._update_gauges()
+
+        self.window_started = time.monotonic()
+        self.latencies = []
+        self.errors = self.throttled = self.captchas = 0
+        self.limiter.peak = self.limiter.in_flight
+        self.delayed = self.rate_limiter.delayed
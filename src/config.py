@@ -11,14 +11,45 @@ class ScraperConfig:
         self.enable_csv_output: bool = True
         self.enable_db_storage: bool = True
         self.enable_markdown_output: bool = True  # New feature
+        self.enable_parquet_output: bool = False
+        self.parquet_path: str = "./Results/parquet"  # Dataset shared across runs
+        self.parquet_row_group_size: int = 10000
         self.enable_proxy_rotation: bool = True
         self.enable_user_agent_rotation: bool = True
         self.enable_captcha_detection: bool = True
         # File download features
         self.enable_file_downloads: bool = True
         self.timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-        self.downloads_path: str = f"./Results/amazon_scrape_{self.timestamp}/downloads"
+        self.output_folder: str = f"./Results/amazon_scrape_{self.timestamp}"
+        self.downloads_path: str = f"{self.output_folder}/downloads"
         self.wait_for_downloads: int = 10
+        # Crash recovery
+        self.enable_journal: bool = True  # Record per-URL state in journal.jsonl
+        self.resume: bool = False  # Continue the run already in output_folder
+        # Search targets
+        self.base_url: str = "https://www.amazon.com/s?k="
+        self.keywords: List[str] = ["Samsung", "Apple", "Honor",
+                                    "Huawei", "OnePlus", "Xiaomi", "Google Pixel"]
+        self.keywords_file: str = None  # Read keywords lazily from this file instead
+        self.keyword_shard: tuple = None  # (index, count): only every count-th keyword
+        # Offline replay
+        self.record_html_path: str = None  # Save rendered HTML per URL here
+        # Product images, stored by content hash and shared across runs
+        self.enable_image_downloads: bool = False
+        self.image_store_path: str = "./Results/images"
+        self.image_concurrency: int = 8  # Parallel image downloads, separate from page fetches
+        self.image_queue_size: int = 1000  # Image URLs queued before the crawl waits
+        self.image_revalidate_after: int = 24 * 3600  # Reuse stored images this long, then revalidate
+        self.image_max_bytes: int = 10 * 1024 * 1024
+        # Product detail pages, fetched in a second stage with their own limits
+        self.enable_detail_pages: bool = False
+        self.detail_concurrency: int = 2  # Starting limit when adaptive
+        self.detail_max_concurrency: int = 8  # Adaptive upper bound
+        self.detail_requests_per_second: float = 1.0  # Per proxy, on top of the search rate
+        self.detail_queue_size: int = 1000  # Detail pages queued before the search stage waits
+        self.detail_priority: str = "price_change"  # "price_change" or "rating" first
+        self.detail_refresh_after: int = 7 * 24 * 3600  # Skip ASINs fetched this recently
+        self.detail_state_path: str = "./Results/crawl_state.db"  # Shared across runs
         # Link and media features
         self.exclude_external_links: bool = True
         self.exclude_social_media_links: bool = True
@@ -28,12 +59,81 @@ class ScraperConfig:
             "facebook.com", "twitter.com", "instagram.com"]
         # Optimization features
         self.max_retries: int = 3
-        self.retry_delay: int = 5
-        self.requests_per_second: int = 2
-        self.max_concurrent_requests: int = 5
+        self.retry_delay: int = 5  # Base of the jittered exponential backoff
+        self.retry_max_delay: int = 60  # Backoff cap in seconds
+        self.retry_budget_ratio: float = 0.2  # Retries allowed per first attempt
+        self.retry_budget_reserve: int = 10  # Retries allowed before any traffic
+        self.breaker_failure_threshold: int = 5  # Blocking failures before a host/proxy is paused
+        self.breaker_reset_timeout: int = 30  # Seconds before a paused host/proxy is probed
+        self.breaker_max_reset_timeout: int = 600  # Cap as failed probes double the pause
+        self.requests_per_second: float = 2.0  # Per proxy
+        self.rate_limit_burst: int = 2
+        self.host_requests_per_second: float = None  # None = no per-host cap
+        self.max_concurrent_requests: int = 5  # Starting limit when adaptive
+        # Adaptive concurrency: AIMD on latency, error and CAPTCHA rates
+        self.enable_adaptive_concurrency: bool = True
+        self.adaptive_min_concurrency: int = 1
+        self.adaptive_max_concurrency: int = 32
+        self.adaptive_min_rate: float = 0.2  # Per proxy
+        self.adaptive_max_rate: float = 10.0  # Per proxy
+        self.adaptive_interval: float = 5.0  # Seconds of outcomes judged per adjustment
+        self.adaptive_latency_tolerance: float = 2.0  # Median latency vs baseline before cutting
+        self.adaptive_error_threshold: float = 0.1  # Error (or 429/503) share before cutting
+        self.adaptive_captcha_threshold: float = 0.02  # CAPTCHA share before cutting
+        self.browser_pool_size: int = 3  # Contexts started up front, each with its own proxy
+        self.max_context_failures: int = 3  # Consecutive errors before a context is retired
         self.cache_ttl: int = 3600  # 1 hour
+        self.cache_path: str = "./Results/page_cache.db"  # Shared across runs
+        self.cache_max_bytes: int = 512 * 1024 * 1024  # 512 MB
         self.chunk_size: int = 1000  # For batch processing
+        self.sink_queue_size: int = 100  # Pages buffered before crawling waits on writers
         self.compression_enabled: bool = False
+        # Link and media archives: JSON Lines in rolling segments with a frame index
+        self.compression_codec: str = "zstd"  # "zstd" (gzip if zstandard is missing) or "gzip"
+        self.compression_dictionary: bool = False  # Train a zstd dictionary on the first records
+        self.archive_frame_size: int = 1024 * 1024  # Bytes of records compressed together
+        self.archive_segment_max_bytes: int = 256 * 1024 * 1024
+        self.archive_segment_max_age: int = 0  # Seconds, 0 = rotate by size only
+        # Live metrics
+        self.metrics_snapshot_interval: int = 30  # Seconds between snapshots, 0 = off
+        self.metrics_port: int = None  # Serve Prometheus metrics on this port
+        self.metrics_host: str = "127.0.0.1"
+        self.metrics_keyword_labels: int = 20  # Keywords with their own histograms; rest "other"
+        # Profiling, written into the run folder
+        self.enable_tracing: bool = False  # Chrome trace of spans in trace.json
+        self.enable_profiling: bool = False  # cProfile and sampled stacks
+        self.profile_sample_interval: float = 0.01  # Seconds between stack samples
+        self.memory_snapshot_interval: int = 0  # Seconds between tracemalloc snapshots, 0 = off
+        # Fetch engine: "browser" renders every page in Chromium, "http" fetches
+        # with a pooled HTTP client and only falls back to the browser when needed
+        self.fetch_engine: str = "browser"
+        self.browser_cache_mode: str = "enabled"  # crawl4ai CacheMode: "enabled", "bypass", ...
+        self.timeout: int = 30  # Request timeout in seconds
+        self.max_redirects: int = 10
+        self.http_connection_limit: int = 100
+        # Markdown report filter
+        self.filter_min_rating: float = 4.0
+        self.filter_exclude_sponsored: bool = True
+        self.filter_min_price: float = None
+        self.filter_max_price: float = None
+        # Crawl frontier
+        self.follow_pagination: bool = True
+        self.max_depth: int = 5  # Result pages per keyword
+        self.keyword_max_depth: Dict[str, int] = {}  # Per-keyword overrides
+        self.seen_set_capacity: int = 1_000_000
+        self.seen_set_error_rate: float = 0.001
+        self.frontier_queue_size: int = 1000  # Seed URLs queued ahead of the workers
+        # Incremental recrawl
+        self.enable_change_detection: bool = False  # Only write new and changed products
+        self.change_state_path: str = "./Results/crawl_state.db"  # Shared across runs
+        self.adaptive_recrawl: bool = False  # Skip keywords whose recrawl is not yet due
+        self.recrawl_min_interval: int = 6 * 3600  # 6 hours
+        self.recrawl_max_interval: int = 7 * 24 * 3600  # 1 week
+        # Cross-run warehouse (python main.py --consolidate)
+        self.warehouse_path: str = "./Results/warehouse.db"
+        self.warehouse_compact_after_days: int = 90  # Then keep one version per product and month
+        self.warehouse_retention_days: int = 0  # Drop older history; 0 = keep everything
+        self.warehouse_full_vacuum: bool = False  # Rebuild the whole file instead of freeing pages
 
         # Add some descriptive names for the dashboard
         self.feature_descriptions = {
@@ -47,10 +147,27 @@ class ScraperConfig:
             "enable_file_downloads": "File Downloads",
             "exclude_external_links": "External Links Filter",
             "enable_markdown_output": "Markdown Export",
+            "enable_parquet_output": "Parquet Export",
             "exclude_social_media_links": "Social Media Filter",
             "exclude_external_images": "External Images Filter",
             "wait_for_images": "Wait for Images",
-            "compression_enabled": "Data Compression"
+            "compression_enabled": "Data Compression",
+            "follow_pagination": "Pagination Following",
+            "enable_journal": "Crawl Journal",
+            "enable_change_detection": "Change Detection",
+            "enable_image_downloads": "Image Downloads",
+            "enable_adaptive_concurrency": "Adaptive Concurrency",
+            "enable_detail_pages": "Product Detail Pages"
+        }
+
+    def get_archive_options(self) -> Dict:
+        """RecordWriter options of the link and media archives"""
+        return {
+            "codec": self.compression_codec if self.compression_enabled else "none",
+            "dictionary": self.compression_dictionary,
+            "frame_size": self.archive_frame_size,
+            "segment_max_bytes": self.archive_segment_max_bytes,
+            "segment_max_age": self.archive_segment_max_age,
         }
 
     def print_dashboard(self):
@@ -72,11 +189,26 @@ class ScraperConfig:
         print("\n⚙️ PERFORMANCE SETTINGS:")
         print("-"*80)
         print(f"🔄 Max Retries: {self.max_retries}")
-        print(f"⏱️  Retry Delay: {self.retry_delay} seconds")
-        print(f"🚦 Requests Per Second: {self.requests_per_second}")
-        print(f"🔀 Max Concurrent Requests: {self.max_concurrent_requests}")
+        print(f"⏱️  Retry Delay: {self.retry_delay}-{self.retry_max_delay} seconds "
+              f"(budget {self.retry_budget_ratio:.0%})")
+        print(f"🚦 Requests Per Second: {self.requests_per_second} "
+              f"(burst {self.rate_limit_burst})")
+        if self.host_requests_per_second:
+            print(f"🌍 Per-Host Requests Per Second: {self.host_requests_per_second}")
+        if self.enable_adaptive_concurrency:
+            print(f"🔀 Concurrent Requests: adaptive, {self.adaptive_min_concurrency}-"
+                  f"{self.adaptive_max_concurrency} (starting at {self.max_concurrent_requests})")
+        else:
+            print(f"🔀 Max Concurrent Requests: {self.max_concurrent_requests}")
+        if self.enable_detail_pages:
+            print(f"🔎 Detail Pages: {self.detail_concurrency} concurrent, "
+                  f"{self.detail_requests_per_second} per second, {self.detail_priority} first")
+        print(f"🧭 Browser Pool Size: {self.browser_pool_size}")
+        print(f"🛠️  Fetch Engine: {self.fetch_engine}")
         print(f"💾 Cache TTL: {self.cache_ttl} seconds")
+        print(f"🗃️  Cache Budget: {self.cache_max_bytes / (1024 * 1024):.0f} MB")
         print(f"📦 Processing Chunk Size: {self.chunk_size} items")
+        print(f"📄 Max Pages Per Keyword: {self.max_depth}")
 
         # Target Configuration Section
         print("\n🎯 TARGET CONFIGURATION:")
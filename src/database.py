@@ -1,16 +1,107 @@
+import json
 import sqlite3
-from typing import List, Dict
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Optional, Tuple
 import logging
+from .models import ScraperMetrics
+from .normalize import normalize_products
+from .profiling import Tracer
+
+PRODUCT_COLUMNS = ["asin", "title", "url", "image", "rating", "reviews_count",
+                   "price", "original_price", "sponsored", "delivery_info",
+                   "price_value", "original_price_value", "discount_percent",
+                   "rating_value", "reviews_count_value"]
+
+DETAIL_COLUMNS = ["asin", "url", "keyword", "title", "brand", "seller", "availability",
+                  "in_stock", "price", "price_value", "rating", "rating_value",
+                  "reviews_count", "reviews_count_value", "features", "specs", "variants",
+                  "fetched_at"]
+
+NUMERIC_COLUMNS = {"price_value": "REAL", "original_price_value": "REAL",
+                   "discount_percent": "REAL", "rating_value": "REAL",
+                   "reviews_count_value": "INTEGER"}
+
+PRODUCT_UPSERT_CLAUSE = (
+    "ON CONFLICT(asin) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in PRODUCT_COLUMNS[1:])
+)
+
+UPSERT_PRODUCT_SQL = (
+    f"INSERT INTO products ({', '.join(PRODUCT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in PRODUCT_COLUMNS)}) "
+    + PRODUCT_UPSERT_CLAUSE
+)
+
+
+def get_columns(conn, table: str, schema: str = "main") -> List[str]:
+    """Columns of a table, empty when the table does not exist"""
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def get_rowid_filter(rowids: Optional[Tuple[int, int]]) -> str:
+    """Condition selecting the rows in a ``(after, until]`` rowid range, or every row"""
+    if rowids is None:
+        return "true"
+    return f"rowid > {int(rowids[0])} AND rowid <= {int(rowids[1])}"
+
+
+def fill_numeric_columns(conn, table: str) -> int:
+    """Parse the price, rating and review count strings of a table into its numeric columns"""
+    rows = conn.execute(
+        f"SELECT rowid, price, original_price, rating, reviews_count FROM {table}").fetchall()
+    products = normalize_products([
+        dict(zip(("rowid", "price", "original_price", "rating", "reviews_count"), row))
+        for row in rows
+    ])
+    conn.executemany(
+        f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in NUMERIC_COLUMNS)} "
+        "WHERE rowid = ?",
+        [tuple(product[column] for column in [*NUMERIC_COLUMNS, "rowid"])
+         for product in products])
+    return len(products)
+
 
 class Database:
-    """Database handler for storing scraped data"""
-    def __init__(self, db_path: str):
+    """Database handler for storing scraped data
+
+    Writes go through a single background thread that owns one connection
+    and commits each queued batch with executemany in one transaction.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 1000, queue_size: int = 100,
+                 tracer: Optional[Tracer] = None, metrics: Optional[ScraperMetrics] = None):
         self.db_path = db_path
+        self.tracer = tracer or Tracer()
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.thread: Optional[threading.Thread] = None
+        self.metrics = metrics
+        self.writers = {
+            "products": self.upsert_products,
+            "links": self.insert_links,
+            "media": self.insert_media,
+            "details": self.upsert_details,
+            "seen": self.mark_seen,
+        }
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
 
-    def create_tables(self):
-        with sqlite3.connect(self.db_path) as conn:
+    def create_tables(self, conn: Optional[sqlite3.Connection] = None):
+        owns_connection = conn is None
+        conn = conn or self.connect()
+        with conn:
             cursor = conn.cursor()
-            
+
             # Create products table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS products (
@@ -23,8 +114,14 @@ class Database:
                     price TEXT,
                     original_price TEXT,
                     sponsored TEXT,
-                    delivery_info TEXT
+                    delivery_info TEXT,
+                    price_value REAL,
+                    original_price_value REAL,
+                    discount_percent REAL,
+                    rating_value REAL,
+                    reviews_count_value INTEGER
                 )""")
+            self.migrate(cursor)
 
             # Create links table
             cursor.execute("""
@@ -53,25 +150,302 @@ class Database:
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
                 )""")
 
+            # Create product details table (detail page stage)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS product_details (
+                    asin TEXT PRIMARY KEY,
+                    url TEXT,
+                    keyword TEXT,
+                    title TEXT,
+                    brand TEXT,
+                    seller TEXT,
+                    availability TEXT,
+                    in_stock INTEGER,
+                    price TEXT,
+                    price_value REAL,
+                    rating TEXT,
+                    rating_value REAL,
+                    reviews_count TEXT,
+                    reviews_count_value INTEGER,
+                    features TEXT,
+                    specs TEXT,
+                    variants TEXT,
+                    fetched_at TEXT
+                )""")
+
+            # Listed products left out of products because they did not change,
+            # so that the warehouse still knows they were seen
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS products_seen (
+                    asin TEXT PRIMARY KEY,
+                    seen_at REAL
+                )""")
+
             # Add indexes
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_asin ON products(asin)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_price ON products(price_value)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_rating ON products(rating_value)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_reviews ON products(reviews_count_value)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_discount ON products(discount_percent)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_links_url ON links(url)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_url ON media(url)")
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_links_url_href ON links(url, href)")
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_media_url_src ON media(url, src)")
+            self.create_search_index(cursor)
+        if owns_connection:
+            conn.close()
+
+    def migrate(self, cursor: sqlite3.Cursor):
+        """Add the numeric columns to a products table written before they existed
+
+        The new columns are filled by parsing the stored price, rating and
+        review count strings the same way new products are normalized.
+        """
+        missing = [column for column in NUMERIC_COLUMNS
+                   if column not in get_columns(cursor, "products")]
+        if not missing:
+            return
+        for column in missing:
+            cursor.execute(f"ALTER TABLE products ADD COLUMN {column} {NUMERIC_COLUMNS[column]}")
+        count = fill_numeric_columns(cursor, "products")
+        logging.info(f"Added {', '.join(missing)} to {count} products in {self.db_path}")
+
+    def create_search_index(self, cursor: sqlite3.Cursor):
+        """Full-text index of product titles, kept in sync with the products table by triggers"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+                "title, content='products', content_rowid='rowid', "
+                "tokenize='unicode61 remove_diacritics 2')")
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Full-text search unavailable: {str(e)}")
+            return
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, title) VALUES (new.rowid, new.title);
+            END""")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, title)
+                VALUES ('delete', old.rowid, old.title);
+            END""")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF title ON products
+            WHEN old.title IS NOT new.title BEGIN
+                INSERT INTO products_fts(products_fts, rowid, title)
+                VALUES ('delete', old.rowid, old.title);
+                INSERT INTO products_fts(rowid, title) VALUES (new.rowid, new.title);
+            END""")
+        if not exists:
+            # Index the rows of a database created before the index existed
+            cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+    def upsert_products(self, cursor: sqlite3.Cursor, products: List[Dict]):
+        """Insert products, refreshing the stored row of ASINs seen before"""
+        cursor.executemany(UPSERT_PRODUCT_SQL, [
+            tuple(
+                str(product.get(column)) if column in ("sponsored", "delivery_info")
+                else product.get(column)
+                for column in PRODUCT_COLUMNS
+            )
+            for product in products
+        ])
+
+    def insert_links(self, cursor: sqlite3.Cursor, links: List[Dict]):
+        """Insert link records, skipping (url, href) pairs already stored"""
+        cursor.executemany(
+            "INSERT OR IGNORE INTO links (url, href, text, title, base_domain, link_type) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    link.get("url"), link.get("href"), link.get("text"), link.get("title"),
+                    link.get("base_domain"), link.get("link_type")
+                )
+                for link in links
+            ])
+
+    def insert_media(self, cursor: sqlite3.Cursor, media: List[Dict]):
+        """Insert media records, skipping (url, src) pairs already stored"""
+        cursor.executemany(
+            "INSERT OR IGNORE INTO media (url, src, alt, type, score, width, height) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    item.get("url"), item.get("src"), item.get("alt"), item.get("type"),
+                    item.get("score"), item.get("width"), item.get("height")
+                )
+                for item in media
+            ])
+
+    def upsert_details(self, cursor: sqlite3.Cursor, details: List[Dict]):
+        """Insert product details, replacing an earlier fetch of the same ASIN"""
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO product_details ({', '.join(DETAIL_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in DETAIL_COLUMNS)})",
+            [
+                tuple(
+                    json.dumps(item.get(column)) if column in ("features", "specs", "variants")
+                    else item.get(column)
+                    for column in DETAIL_COLUMNS
+                )
+                for item in details
+            ])
+
+    def mark_seen(self, cursor: sqlite3.Cursor, products: List[Dict]):
+        """Record the ASINs of unchanged products listed again"""
+        now = time.time()
+        cursor.executemany(
+            "INSERT INTO products_seen VALUES (?, ?) "
+            "ON CONFLICT(asin) DO UPDATE SET seen_at = excluded.seen_at",
+            [(product["asin"], now) for product in products if product.get("asin")])
 
     def insert_products(self, products: List[Dict]):
+        """Upsert products synchronously, in one transaction per batch"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            conn = self.connect()
+            with conn:
                 cursor = conn.cursor()
-                for product in products:
-                    cursor.execute(
-                        "INSERT OR IGNORE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (
-                            product.get("asin"), product.get("title"), product.get("url"),
-                            product.get("image"), product.get("rating"), product.get("reviews_count"),
-                            product.get("price"), product.get("original_price"),
-                            str(product.get("sponsored")), str(product.get("delivery_info"))
-                        )
-                    )
+                for i in range(0, len(products), self.batch_size):
+                    self.upsert_products(cursor, products[i:i + self.batch_size])
+            conn.close()
         except Exception as e:
             logging.error(f"Database error: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def merge_from(self, source_path: str, conn: Optional[sqlite3.Connection] = None):
+        """Merge the products, links and media of another database into this one"""
+        owns_connection = conn is None
+        conn = conn or self.connect()
+        columns = ", ".join(PRODUCT_COLUMNS)
+        conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+        try:
+            with conn:
+                # "WHERE true" keeps SQLite from parsing ON CONFLICT as a join clause
+                conn.execute(
+                    f"INSERT INTO products ({columns}) "
+                    f"SELECT {columns} FROM source.products WHERE true "
+                    + PRODUCT_UPSERT_CLAUSE)
+                if conn.execute("SELECT 1 FROM source.sqlite_master "
+                                "WHERE name = 'products_seen'").fetchone():
+                    conn.execute(
+                        "INSERT INTO products_seen SELECT asin, seen_at FROM source.products_seen "
+                        "WHERE true ON CONFLICT(asin) DO UPDATE SET "
+                        "seen_at = max(seen_at, excluded.seen_at)")
+                self.merge_records(conn)
+        finally:
+            conn.execute("DETACH DATABASE source")
+            if owns_connection:
+                conn.close()
+
+    def merge_records(self, conn: sqlite3.Connection, schema: str = "source",
+                      ranges: Optional[Dict[str, Tuple[int, int]]] = None):
+        """Copy the links, media and product details of an attached database
+
+        Links and media already stored only take the later timestamp, so it
+        tells when they were last seen; details replace older fetches of the
+        same ASIN. ``ranges`` limits tables to the rowids in ``(after, until]``.
+        """
+        ranges = ranges or {}
+        conn.execute(
+            "INSERT INTO links "
+            "(url, href, text, title, base_domain, link_type, timestamp) "
+            "SELECT url, href, text, title, base_domain, link_type, timestamp "
+            f"FROM {schema}.links WHERE {get_rowid_filter(ranges.get('links'))} "
+            "ON CONFLICT(url, href) DO UPDATE SET "
+            "timestamp = max(timestamp, excluded.timestamp)")
+        conn.execute(
+            "INSERT INTO media "
+            "(url, src, alt, type, score, width, height, timestamp) "
+            "SELECT url, src, alt, type, score, width, height, timestamp "
+            f"FROM {schema}.media WHERE {get_rowid_filter(ranges.get('media'))} "
+            "ON CONFLICT(url, src) DO UPDATE SET "
+            "timestamp = max(timestamp, excluded.timestamp)")
+        if not conn.execute(f"SELECT 1 FROM {schema}.sqlite_master "
+                            "WHERE name = 'product_details'").fetchone():
+            return  # Written before detail pages were scraped
+        columns = ", ".join(DETAIL_COLUMNS)
+        conn.execute(
+            f"INSERT INTO product_details ({columns}) "
+            f"SELECT {columns} FROM {schema}.product_details "
+            f"WHERE {get_rowid_filter(ranges.get('product_details'))} "
+            "ON CONFLICT(asin) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in DETAIL_COLUMNS[1:])
+            + " WHERE excluded.fetched_at >= product_details.fetched_at")
+
+    def start(self):
+        """Create the tables and start the writer thread"""
+        self.create_tables()
+        self.thread = threading.Thread(
+            target=self._writer_loop, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, table: str, rows: List[Dict]) -> Future:
+        """Queue rows for the writer thread, blocking while it is behind
+
+        The returned future completes once the rows are committed, or fails
+        if their batch had to be dropped.
+        """
+        committed = Future()
+        if rows:
+            self.queue.put((table, rows, committed))
+        else:
+            committed.set_result(None)
+        return committed
+
+    def close(self):
+        """Flush queued rows and stop the writer thread"""
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _writer_loop(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+        running = True
+        while running:
+            # Block for the first batch, then drain whatever else is queued
+            # into the same transaction, up to batch_size rows
+            items = [self.queue.get()]
+            pending = len(items[0][1]) if items[0] else 0
+            while items[-1] is not None and pending < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                pending += len(item[1]) if item else 0
+
+            if items[-1] is None:
+                running = False
+                items.pop()
+            try:
+                with self.tracer.span("db_transaction", batches=len(items), rows=pending), conn:
+                    for table, rows, _ in items:
+                        self.writers[table](cursor, rows)
+                for _, _, committed in items:
+                    committed.set_result(None)
+            except Exception as e:
+                # The transaction was rolled back; commit the batches one by
+                # one so only the one at fault is lost
+                logging.error(f"Database error, retrying {len(items)} batches "
+                              f"separately: {str(e)}")
+                for table, rows, committed in items:
+                    try:
+                        with conn:
+                            self.writers[table](cursor, rows)
+                        committed.set_result(None)
+                    except Exception as e:
+                        if self.metrics is not None:
+                            self.metrics.db_batches_dropped += 1
+                        logging.error(f"Dropped a batch of {len(rows)} {table} rows: {str(e)}")
+                        committed.set_exception(e)
+        conn.close()
@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import itertools
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+import pandas as pd
+from .frontier import SeenSet
+from .models import ScraperMetrics
+from .normalize import parse_numbers
+
+DETAIL_SCHEMA = {
+    "name": "Amazon Product Details",
+    "baseSelector": "#dp",
+    "fields": [
+        {"name": "asin", "selector": "input#ASIN",
+            "type": "attribute", "attribute": "value"},
+        {"name": "title", "selector": "#productTitle", "type": "text"},
+        {"name": "brand", "selector": "#bylineInfo", "type": "text"},
+        {"name": "price", "selector": "#corePrice_feature_div .a-offscreen, "
+            "#corePriceDisplay_desktop_feature_div .a-offscreen", "type": "text"},
+        {"name": "rating", "selector": "#acrPopover",
+            "type": "attribute", "attribute": "title"},
+        {"name": "reviews_count", "selector": "#acrCustomerReviewText", "type": "text"},
+        {"name": "availability", "selector": "#availability", "type": "text"},
+        {"name": "seller", "selector": "#sellerProfileTriggerId, "
+            "#merchantInfoFeature_feature_div .offer-display-feature-text-message",
+            "type": "text"},
+        {"name": "features", "selector": "#feature-bullets li span.a-list-item",
+            "type": "text", "multiple": True},
+        {"name": "spec_names", "selector": "#productDetails_techSpec_section_1 th",
+            "type": "text", "multiple": True},
+        {"name": "spec_values", "selector": "#productDetails_techSpec_section_1 td",
+            "type": "text", "multiple": True},
+        {"name": "variant_asins", "selector": "#twister li[data-defaultasin]",
+            "type": "attribute", "attribute": "data-defaultasin", "multiple": True},
+        {"name": "variant_names", "selector": "#twister li[data-defaultasin]",
+            "type": "attribute", "attribute": "title", "multiple": True},
+        {"name": "captcha_detected",
+            "selector": "#captchacharacters", "type": "exists"},
+    ],
+}
+
+OUT_OF_STOCK = ("currently unavailable", "out of stock", "temporarily out of stock")
+
+
+def get_detail_url(base_url: str, asin: str) -> str:
+    """Canonical detail page of an ASIN on the same site as the search pages"""
+    return urljoin(base_url, f"/dp/{asin}")
+
+
+def get_stock(availability: Optional[str]) -> Optional[bool]:
+    if not availability:
+        return None
+    text = availability.lower()
+    if any(phrase in text for phrase in OUT_OF_STOCK):
+        return False
+    return "in stock" in text or None
+
+
+@dataclass
+class DetailJob:
+    """A product whose detail page is waiting to be fetched"""
+    asin: str
+    url: str
+    keyword: str
+    price_value: Optional[float] = None
+    rating_value: Optional[float] = None
+
+
+def parse_details(item: Dict, job: DetailJob) -> Dict:
+    """Turn the extracted fields of a detail page into one flat record"""
+    price, rating, reviews = parse_numbers(pd.Series(
+        [item.get("price"), item.get("rating"), item.get("reviews_count")], dtype="object"))
+    names = item.get("variant_names", [])
+    variants = [{"asin": asin, "name": names[i] if i < len(names) else None}
+                for i, asin in enumerate(item.get("variant_asins", []))]
+    return {
+        "asin": job.asin,
+        "url": job.url,
+        "keyword": job.keyword,
+        "title": item.get("title"),
+        "brand": item.get("brand"),
+        "seller": item.get("seller"),
+        "availability": item.get("availability"),
+        "in_stock": get_stock(item.get("availability")),
+        "price": item.get("price"),
+        "price_value": None if pd.isna(price) else float(price),
+        "rating": item.get("rating"),
+        "rating_value": None if pd.isna(rating) else float(rating),
+        "reviews_count": item.get("reviews_count"),
+        "reviews_count_value": None if pd.isna(reviews) else int(reviews),
+        "features": item.get("features", []),
+        "specs": dict(zip(item.get("spec_names", []), item.get("spec_values", []))),
+        "variants": variants,
+        "fetched_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+class DetailQueue:
+    """Priority queue of product detail pages, fed with the products of search pages
+
+    Each ASIN is queued at most once per run. ASINs whose details were
+    fetched less than ``refresh_after`` seconds ago (in this or an earlier
+    run, per the state database) are skipped unless their listed price
+    changed since. With ``priority`` "price_change", products whose price
+    moved most since their last detail fetch come first, then the best
+    rated; with "rating", the other way round. ``put_products`` waits while
+    ``max_pending`` detail jobs are queued.
+    """
+
+    def __init__(self, base_url: str, state_path: str, priority: str = "price_change",
+                 refresh_after: float = 7 * 24 * 3600, max_pending: int = 1000,
+                 seen_capacity: int = 1_000_000, seen_error_rate: float = 0.001,
+                 metrics: Optional[ScraperMetrics] = None):
+        if priority not in ("price_change", "rating"):
+            raise ValueError(f"Unknown detail priority: {priority}")
+        self.base_url = base_url
+        self.priority = priority
+        self.refresh_after = refresh_after
+        self.metrics = metrics
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_pending)
+        self.seen = SeenSet(seen_capacity, seen_error_rate)
+        self.order = itertools.count()
+        self.conn = sqlite3.connect(state_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=10000")  # Shared by shard processes
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS detail_state (
+                    asin TEXT PRIMARY KEY,
+                    fetched_at REAL,
+                    price_value REAL,
+                    rating_value REAL
+                )""")
+
+    def _count(self, field: str, amount: int = 1):
+        if self.metrics is not None:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
+
+    def _load_state(self, asins: List[str]) -> Dict[str, tuple]:
+        if not asins:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT asin, fetched_at, price_value FROM detail_state "
+            f"WHERE asin IN ({', '.join('?' for _ in asins)})", asins)
+        return {asin: (fetched_at, price) for asin, fetched_at, price in rows}
+
+    def get_sort_key(self, price_change: float, rating: Optional[float]) -> tuple:
+        rating = rating or 0.0
+        if self.priority == "rating":
+            return (-rating, -price_change)
+        return (-price_change, -rating)
+
+    async def put_products(self, products: List[Dict], keyword: str) -> int:
+        """Queue the detail pages of a batch of normalized products, returning how many"""
+        products = [p for p in products if p.get("asin")]
+        state = self._load_state(list({p["asin"] for p in products}))
+        now = time.time()
+        added = 0
+        for product in products:
+            asin = product["asin"]
+            if not self.seen.add(asin):
+                self._count("details_deduplicated")
+                continue
+            price = product.get("price_value")
+            price_change = 0.0
+            fetched_at, last_price = state.get(asin, (None, None))
+            if price is not None and last_price:
+                price_change = abs(price - last_price) / last_price
+            if fetched_at is not None and now - fetched_at < self.refresh_after \
+                    and not price_change:
+                self._count("details_deduplicated")
+                continue
+            job = DetailJob(asin=asin, url=get_detail_url(self.base_url, asin),
+                            keyword=keyword, price_value=price,
+                            rating_value=product.get("rating_value"))
+            await self.queue.put((self.get_sort_key(price_change, job.rating_value),
+                                  next(self.order), job))
+            added += 1
+        return added
+
+    async def get(self) -> DetailJob:
+        return (await self.queue.get())[-1]
+
+    def task_done(self):
+        self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    def mark_fetched(self, job: DetailJob):
+        """Remember when an ASIN's details were fetched and at which listed price"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO detail_state VALUES (?, ?, ?, ?)",
+                (job.asin, time.time(), job.price_value, job.rating_value))
+
+    def __len__(self) -> int:
+        return self.queue.qsize()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
+from urllib.parse import urljoin, urlparse
+import aiohttp
+import lxml.html
+from lxml.cssselect import CSSSelector
+from .telemetry import StageMetrics
+
+
+@dataclass
+class PageResult:
+    """Fetched page with the same attributes the scraper reads from a crawl4ai result"""
+    url: str
+    success: bool
+    status_code: Optional[int] = None
+    html: str = ""
+    extracted_content: str = "[]"
+    error_message: str = ""
+    links: Dict[str, List[Dict]] = field(default_factory=lambda: {"internal": [], "external": []})
+    media: Dict[str, List[Dict]] = field(
+        default_factory=lambda: {"images": [], "videos": [], "audio": []})
+    downloaded_files: List[str] = field(default_factory=list)
+
+
+def get_base_domain(netloc: str) -> str:
+    parts = netloc.lower().split(":")[0].split(".")
+    return ".".join(parts[-2:])
+
+
+class CssSchemaExtractor:
+    """Evaluate a JsonCssExtractionStrategy schema with lxml, compiling selectors once"""
+
+    def __init__(self, schema: Dict):
+        self.base_selector = CSSSelector(schema["baseSelector"])
+        self.fields = [
+            (spec, CSSSelector(spec["selector"]) if spec.get("selector") else None)
+            for spec in schema["fields"]
+        ]
+
+    def _value(self, spec: Dict, element) -> Optional[str]:
+        if spec["type"] == "attribute":
+            return element.get(spec["attribute"])
+        return " ".join(element.text_content().split()) or None
+
+    def extract_item(self, element) -> Dict:
+        item = {}
+        for spec, selector in self.fields:
+            # An empty selector refers to the result element itself
+            matches = selector(element) if selector is not None else [element]
+            if spec["type"] == "exists":
+                if matches:
+                    item[spec["name"]] = True
+            elif spec.get("multiple"):
+                values = [v for v in (self._value(spec, m) for m in matches) if v]
+                if values:
+                    item[spec["name"]] = values
+            elif matches:
+                value = self._value(spec, matches[0])
+                if value is not None:
+                    item[spec["name"]] = value
+        return item
+
+    def extract(self, document) -> List[Dict]:
+        return [self.extract_item(element) for element in self.base_selector(document)]
+
+
+class HttpFetcher:
+    """Fetch pages over a pooled keep-alive HTTP client and parse them with lxml"""
+
+    def __init__(self, schema: Dict, timeout: int = 30, max_redirects: int = 10,
+                 limit: int = 100, limit_per_host: int = 20,
+                 stages: Optional[StageMetrics] = None):
+        self.extractor = CssSchemaExtractor(schema)
+        self.stages = stages
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                ttl_dns_cache=300, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                "Accept": "text/html,application/xhtml+xml,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+            })
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def fetch(self, url: str, proxy: Optional[str] = None,
+                    user_agent: Optional[str] = None,
+                    extractor: Optional[CssSchemaExtractor] = None) -> PageResult:
+        """Fetch and parse a page, with another schema's extractor if given"""
+        headers = {"User-Agent": user_agent} if user_agent else {}
+        try:
+            async with self.session.get(url, proxy=proxy, headers=headers,
+                                        max_redirects=self.max_redirects) as response:
+                html = await response.text(errors="replace")
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return PageResult(url=url, success=False,
+                              error_message=f"{type(e).__name__}: {str(e)}")
+        if status != 200:
+            return PageResult(url=url, success=False, status_code=status, html=html,
+                              error_message=f"HTTP {status}")
+        # Parsing is CPU-bound; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await loop.run_in_executor(None, self.parse, url, html, status, extractor)
+        if self.stages:
+            self.stages.observe("extraction", loop.time() - started, engine="http")
+        return result
+
+    def parse(self, url: str, html: str, status: int = 200,
+              extractor: Optional[CssSchemaExtractor] = None) -> PageResult:
+        result = PageResult(url=url, success=True, status_code=status, html=html)
+        if not html.strip():
+            return result
+        document = lxml.html.document_fromstring(html)
+        result.extracted_content = json.dumps((extractor or self.extractor).extract(document))
+
+        page_domain = get_base_domain(urlparse(url).netloc)
+        seen = set()
+        for anchor in document.iterfind(".//a[@href]"):
+            href = urljoin(url, anchor.get("href"))
+            if href in seen or not href.startswith("http"):
+                continue
+            seen.add(href)
+            base_domain = get_base_domain(urlparse(href).netloc)
+            link_type = "internal" if base_domain == page_domain else "external"
+            result.links[link_type].append({
+                "href": href,
+                "text": " ".join(anchor.text_content().split()),
+                "title": anchor.get("title", ""),
+                "base_domain": base_domain,
+            })
+        for image in document.iterfind(".//img[@src]"):
+            result.media["images"].append({
+                "src": urljoin(url, image.get("src")),
+                "alt": image.get("alt", ""),
+                "type": "image",
+                "width": image.get("width"),
+            })
+        return result
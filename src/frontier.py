@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urljoin, urlparse, parse_qs
+from .journal import CrawlJournal
+from .utils import canonicalize_url
+
+
+@dataclass
+class FrontierEntry:
+    """A single URL waiting to be crawled"""
+    url: str
+    keyword: str
+    depth: int = 1
+
+
+class SeenSet:
+    """Bloom filter used to remember which URLs have already been queued"""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key: str) -> bool:
+        """Add a key, returning False if it was (probably) already present"""
+        added = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def read_keywords(path: str) -> Iterator[str]:
+    """Yield the keywords of a file one by one, skipping blank lines and # comments"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            keyword = line.strip()
+            if keyword and not keyword.startswith("#"):
+                yield keyword
+
+
+def get_search_keyword(url: str) -> Optional[str]:
+    """Return the search keyword of an Amazon search URL, or None"""
+    parsed = urlparse(url)
+    if parsed.path.rstrip("/") != "/s":
+        return None
+    values = parse_qs(parsed.query).get("k")
+    return values[0] if values else None
+
+
+def get_search_page(url: str) -> int:
+    """Return the results page number of an Amazon search URL"""
+    values = parse_qs(urlparse(url).query).get("page")
+    try:
+        return int(values[0]) if values else 1
+    except ValueError:
+        return 1
+
+
+class CrawlFrontier:
+    """Deduplicating queue of search result pages still to be crawled
+
+    Seeds are fed with ``feed``, which waits while ``max_pending`` entries
+    are already queued, so a huge keyword list is never materialized.
+    Pages discovered by the workers are always accepted; there are at most
+    a few per crawled page.
+    """
+
+    def __init__(self, base_url: str, max_depth: int = 1,
+                 keyword_max_depth: Dict[str, int] = None,
+                 seen_capacity: int = 1_000_000, seen_error_rate: float = 0.001,
+                 journal: Optional[CrawlJournal] = None, max_pending: int = 1000):
+        self.base_url = base_url
+        self.max_pending = max_pending
+        self.drained = asyncio.Event()
+        self.max_depth = max_depth
+        self.keyword_max_depth = keyword_max_depth or {}
+        self.seen = SeenSet(seen_capacity, seen_error_rate)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.total_enqueued = 0
+        self.journal = journal
+
+    def get_max_depth(self, keyword: str) -> int:
+        return self.keyword_max_depth.get(keyword, self.max_depth)
+
+    def get_key(self, url: str) -> str:
+        """Dedupe key: search pages differ only by keyword and page number"""
+        keyword = get_search_keyword(url)
+        if keyword is None:
+            return canonicalize_url(url)
+        return f"{keyword.lower()}|{get_search_page(url)}"
+
+    def push(self, url: str, keyword: str, depth: int = 1) -> bool:
+        """Enqueue the canonical form of a URL unless it is too deep or has been seen before"""
+        url = canonicalize_url(urljoin(self.base_url, url))
+        if depth > self.get_max_depth(keyword):
+            return False
+        if not self.seen.add(self.get_key(url)):
+            return False
+        self.queue.put_nowait(FrontierEntry(url=url, keyword=keyword, depth=depth))
+        self.total_enqueued += 1
+        if self.journal:
+            self.journal.add(url, keyword, depth)
+        return True
+
+    def restore(self) -> int:
+        """Re-queue the journal's unfinished URLs and mark every journaled URL as seen"""
+        self.journal.load(lambda url: self.seen.add(self.get_key(url)))
+        for url in self.journal.entries:
+            self.seen.add(self.get_key(url))
+        unfinished = self.journal.get_unfinished()
+        for entry in unfinished:
+            self.queue.put_nowait(FrontierEntry(
+                url=entry.url, keyword=entry.keyword, depth=entry.depth))
+        self.total_enqueued += len(unfinished)
+        return len(unfinished)
+
+    async def feed(self, url: str, keyword: str) -> bool:
+        """Push a seed URL once the queue has room for it"""
+        while self.queue.qsize() >= self.max_pending:
+            self.drained.clear()
+            await self.drained.wait()
+        return self.push(url, keyword)
+
+    def discover(self, entry: FrontierEntry, hrefs: List[str]) -> int:
+        """Enqueue result pages for the same keyword found on a crawled page"""
+        added = 0
+        current_page = get_search_page(entry.url)
+        for href in hrefs:
+            if not href:
+                continue
+            url = urljoin(self.base_url, href)
+            keyword = get_search_keyword(url)
+            if keyword is None or keyword.lower() != entry.keyword.lower():
+                continue
+            page = get_search_page(url)
+            if page <= current_page:
+                continue
+            if self.push(url, entry.keyword, entry.depth + page - current_page):
+                added += 1
+        return added
+
+    async def get(self) -> FrontierEntry:
+        entry = await self.queue.get()
+        self.drained.set()
+        return entry
+
+    def task_done(self):
+        self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    def __len__(self) -> int:
+        return self.queue.qsize()
@@ -0,0 +1,207 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mimetypes
+import os
+import sqlite3
+import time
+from typing import List, Optional
+from urllib.parse import urlparse
+import aiohttp
+from .models import ScraperMetrics
+from .telemetry import StageMetrics
+from .frontier import SeenSet
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageStore:
+    """Content-addressed image files plus an SQLite index of the URLs they came from
+
+    Files are named by the SHA-256 of their bytes (``<root>/ab/abcd....jpg``),
+    so an image served under several URLs, keywords or runs is stored once.
+    The index keeps each URL's hash and validators for conditional requests.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, "images.db"), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=10000")  # Shared by shard processes
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    content_type TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256)")
+
+    def get(self, url: str) -> Optional[sqlite3.Row]:
+        row = self.conn.execute("SELECT * FROM images WHERE url = ?", (url,)).fetchone()
+        if row is not None and not os.path.exists(os.path.join(self.root, row["path"])):
+            return None  # File removed since; download it again
+        return row
+
+    def get_path(self, sha256: str, extension: str) -> str:
+        return os.path.join(sha256[:2], sha256 + extension)
+
+    def add(self, url: str, tmp_path: str, sha256: str, size: int, content_type: str,
+            etag: Optional[str], last_modified: Optional[str]) -> bool:
+        """Move a downloaded file into place, returning False if its content was already stored"""
+        extension = mimetypes.guess_extension(content_type or "") or \
+            os.path.splitext(urlparse(url).path)[1] or ""
+        extension = {".jpe": ".jpg", ".jpeg": ".jpg"}.get(extension, extension)
+        path = self.get_path(sha256, extension)
+        full_path = os.path.join(self.root, path)
+        new = not os.path.exists(full_path)
+        if new:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(tmp_path, full_path)
+        else:
+            os.remove(tmp_path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, sha256, path, size, content_type, etag, last_modified, time.time()))
+        return new
+
+    def touch(self, url: str):
+        with self.conn:
+            self.conn.execute("UPDATE images SET fetched_at = ? WHERE url = ?",
+                              (time.time(), url))
+
+    def close(self):
+        self.conn.close()
+
+
+class ImageFetcher:
+    """Download product images in the background on a pooled HTTP client
+
+    URLs are queued with ``put`` (waiting while ``max_pending`` are queued)
+    and fetched by ``concurrency`` workers. Images fetched less than
+    ``revalidate_after`` seconds ago are skipped; older ones are
+    revalidated with If-None-Match / If-Modified-Since. Bodies are streamed
+    to disk while being hashed, and files over ``max_bytes`` are dropped.
+    """
+
+    def __init__(self, store: ImageStore, concurrency: int = 8, max_pending: int = 1000,
+                 revalidate_after: float = 24 * 3600, max_bytes: int = 10 * 1024 * 1024,
+                 timeout: int = 30, seen_capacity: int = 1_000_000,
+                 metrics: Optional[ScraperMetrics] = None,
+                 stages: Optional[StageMetrics] = None):
+        self.store = store
+        self.concurrency = concurrency
+        self.revalidate_after = revalidate_after
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.metrics = metrics
+        self.stages = stages
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.seen = SeenSet(seen_capacity)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.workers: List[asyncio.Task] = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, *exc):
+        await self.close(drain=exc_type is None)
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Accept": "image/avif,image/webp,image/*,*/*;q=0.8"})
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+
+    async def close(self, drain: bool = True):
+        """Stop the workers, after fetching the queued images if ``drain`` is set"""
+        if drain:
+            await self.queue.join()
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        if self.session:
+            await self.session.close()
+        self.store.close()
+
+    def _count(self, field: str, amount: int = 1):
+        if self.metrics is not None:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
+
+    async def put(self, url: str):
+        """Queue an image URL once per run"""
+        if url and self.seen.add(url):
+            await self.queue.put(url)
+
+    async def worker(self):
+        while True:
+            url = await self.queue.get()
+            try:
+                await self.fetch(url)
+            except Exception as e:
+                self._count("images_failed")
+                logging.warning(f"Failed to download image {url}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """Store the image at a URL, returning its SHA-256"""
+        row = self.store.get(url)
+        headers = {}
+        if row is not None:
+            if time.time() - row["fetched_at"] < self.revalidate_after:
+                self._count("images_deduplicated")
+                return row["sha256"]
+            if row["etag"]:
+                headers["If-None-Match"] = row["etag"]
+            if row["last_modified"]:
+                headers["If-Modified-Since"] = row["last_modified"]
+
+        timer = self.stages.time("image_fetch") if self.stages else contextlib.nullcontext()
+        with timer:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304 and row is not None:
+                    self.store.touch(url)
+                    self._count("images_not_modified")
+                    return row["sha256"]
+                response.raise_for_status()
+                sha256, size, tmp_path = await self.download(response)
+        new = self.store.add(url, tmp_path, sha256, size, response.content_type,
+                             response.headers.get("ETag"),
+                             response.headers.get("Last-Modified"))
+        self._count("images_downloaded")
+        self._count("image_bytes_downloaded", size)
+        if not new:
+            self._count("images_deduplicated")
+        return sha256
+
+    async def download(self, response: aiohttp.ClientResponse):
+        """Stream a response body to a temporary file while hashing it"""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.store.root, "tmp", f"{os.getpid()}-{id(response)}")
+        try:
+            with open(tmp_path, "wb") as f:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"Image larger than {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        return digest.hexdigest(), size, tmp_path
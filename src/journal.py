@@ -0,0 +1,109 @@
+import json
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class JournalEntry:
+    """Latest known state of one URL"""
+    url: str
+    keyword: str
+    depth: int
+    state: str = PENDING
+    attempts: int = 0
+
+
+class CrawlJournal:
+    """Append-only log of per-URL crawl state, used to resume an interrupted run
+
+    Every state change is appended as one JSON line and flushed, so after a
+    crash replaying the file gives the last state of every URL. Only
+    unfinished URLs are kept in memory; done and failed ones are counted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, JournalEntry] = {}
+        self.counts: Counter = Counter()
+        self.file = None  # Opened on the first change, after any earlier run was loaded
+
+    def load(self, on_finished: Callable[[str], None]) -> int:
+        """Replay and compact the journal of an earlier run, returning its unfinished URLs
+
+        The file is read and rewritten as a stream: a URL is written back with
+        its final state and passed to ``on_finished`` as soon as it is done or
+        failed, so only the unfinished URLs are ever held in memory.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        tmp_path = f"{self.path}.tmp"
+        with open(self.path, encoding="utf-8") as f, \
+                open(tmp_path, "w", encoding="utf-8") as compacted:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn last line from a crash
+                url = record["url"]
+                entry = self.entries.get(url) or JournalEntry(
+                    url=url, keyword=record.get("keyword", ""), depth=record.get("depth", 1))
+                entry.state = record["state"]
+                entry.attempts = record.get("attempts", entry.attempts)
+                if entry.state in (DONE, FAILED):
+                    self.entries.pop(url, None)
+                    self.counts[entry.state] += 1
+                    compacted.write(json.dumps(entry.__dict__) + "\n")
+                    on_finished(url)
+                else:
+                    self.entries[url] = entry
+            for entry in self.entries.values():
+                compacted.write(json.dumps(entry.__dict__) + "\n")
+        os.replace(tmp_path, self.path)
+        return len(self.entries)
+
+    def _append(self, entry: JournalEntry):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        record = {"url": entry.url, "state": entry.state, "attempts": entry.attempts,
+                  "ts": round(time.time(), 3)}
+        if entry.state == PENDING:
+            record.update(keyword=entry.keyword, depth=entry.depth)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def add(self, url: str, keyword: str, depth: int):
+        entry = self.entries[url] = JournalEntry(url=url, keyword=keyword, depth=depth)
+        self._append(entry)
+
+    def mark(self, url: str, state: str):
+        entry = self.entries.get(url)
+        if entry is None:
+            return
+        entry.state = state
+        if state == IN_FLIGHT:
+            entry.attempts += 1
+        self._append(entry)
+        if state in (DONE, FAILED):
+            del self.entries[url]
+            self.counts[state] += 1
+
+    def get_unfinished(self) -> List[JournalEntry]:
+        """URLs that were queued or being fetched when the run stopped"""
+        return [e for e in self.entries.values() if e.state in (PENDING, IN_FLIGHT)]
+
+    def count(self, state: str) -> int:
+        if state in (DONE, FAILED):
+            return self.counts[state]
+        return sum(1 for e in self.entries.values() if e.state == state)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
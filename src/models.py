@@ -1,7 +1,12 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import hashlib
+import json
+import sqlite3
+import zlib
+from .telemetry import StageMetrics
+from .utils import canonicalize_url
 
 @dataclass
 class ScraperMetrics:
@@ -14,6 +19,37 @@ class ScraperMetrics:
     total_downloads: int = 0
     total_bytes_downloaded: int = 0
     captchas_encountered: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_evictions: int = 0
+    http_fetches: int = 0
+    browser_fallbacks: int = 0
+    pages_unchanged: int = 0
+    products_unchanged: int = 0
+    requests_coalesced: int = 0
+    images_downloaded: int = 0
+    images_not_modified: int = 0  # Revalidated with a conditional request
+    images_deduplicated: int = 0  # Already stored, by URL or by content
+    images_failed: int = 0
+    image_bytes_downloaded: int = 0
+    retries: int = 0
+    retries_denied: int = 0  # Retry budget exhausted
+    circuit_breaker_trips: int = 0
+    circuit_breaker_waits: int = 0
+    network_errors: int = 0
+    http_errors: int = 0
+    extraction_errors: int = 0
+    details_fetched: int = 0
+    details_deduplicated: int = 0  # Already queued this run or fetched recently
+    details_failed: int = 0
+    db_batches_dropped: int = 0  # Rows lost to a failed database write
+    limit_increases: int = 0  # Adaptive concurrency limit raised
+    limit_decreases: int = 0
+    concurrency_limit: float = field(default=0.0, metadata={"gauge": True})
+    rate_limit: float = field(default=0.0, metadata={"gauge": True})  # Per proxy
+    detail_concurrency_limit: float = field(default=0.0, metadata={"gauge": True})
+    detail_rate_limit: float = field(default=0.0, metadata={"gauge": True})
+    stages: StageMetrics = field(default_factory=StageMetrics)
 
     def get_success_rate(self) -> float:
         return (self.successful_requests / self.total_requests * 100) if self.total_requests > 0 else 0
@@ -21,25 +57,140 @@ class ScraperMetrics:
     def get_elapsed_time(self) -> float:
         return time.time() - self.start_time
 
+    def get_counters(self) -> Dict[str, int]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.type is int}
+
+    def get_gauges(self) -> Dict[str, float]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.metadata.get("gauge")}
+
+    def merge(self, other: "ScraperMetrics"):
+        """Add another process's counters and latency histograms to these metrics
+
+        Gauges such as the concurrency and rate limits describe one shard, so
+        the merged metrics keep the highest value rather than their sum.
+        """
+        for name, value in other.get_counters().items():
+            setattr(self, name, getattr(self, name) + value)
+        for name, value in other.get_gauges().items():
+            setattr(self, name, max(getattr(self, name), value))
+        self.stages.merge(other.stages)
+
 
 class Cache:
-    """Cache implementation for storing scraped data"""
-    def __init__(self, ttl: int = 3600):
-        self.cache: Dict[str, Any] = {}
+    """Persistent page cache stored in SQLite with TTL and LRU eviction"""
+
+    def __init__(self, ttl: int = 3600, path: str = ":memory:",
+                 max_bytes: int = 512 * 1024 * 1024,
+                 metrics: Optional[ScraperMetrics] = None):
         self.ttl = ttl
+        self.path = path
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=10000")  # Shared by shard processes
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                data BLOB,
+                size INTEGER,
+                created REAL,
+                accessed REAL
+            )""")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed)")
+        # The byte total lives in the file next to the pages, kept current by
+        # triggers, so every shard process evicts against the same budget
+        self.conn.executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                bytes INTEGER
+            );
+            INSERT OR IGNORE INTO cache_size SELECT 0, COALESCE(SUM(size), 0) FROM cache;
+            CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache
+            BEGIN UPDATE cache_size SET bytes = bytes + new.size; END;
+            CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache
+            BEGIN UPDATE cache_size SET bytes = bytes + new.size - old.size; END;
+            CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache
+            BEGIN UPDATE cache_size SET bytes = bytes - old.size; END;
+            COMMIT;
+        """)
+
+    @property
+    def total_bytes(self) -> int:
+        return self.conn.execute("SELECT bytes FROM cache_size").fetchone()[0]
 
     def _get_key(self, url: str) -> str:
-        return hashlib.md5(url.encode()).hexdigest()
+        return hashlib.md5(canonicalize_url(url).encode()).hexdigest()
+
+    def _count(self, field: str, amount: int = 1):
+        if self.metrics is not None:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
 
     def get(self, url: str) -> Any:
         key = self._get_key(url)
-        if key in self.cache:
-            data, timestamp = self.cache[key]
-            if time.time() - timestamp <= self.ttl:
-                return data
-            del self.cache[key]
+        row = self.conn.execute(
+            "SELECT data, size, created FROM cache WHERE key = ?", (key,)).fetchone()
+        if row:
+            data, size, created = row
+            now = time.time()
+            if now - created <= self.ttl:
+                self.conn.execute(
+                    "UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self._count("cache_hits")
+                return json.loads(zlib.decompress(data))
+            self._delete(key)
+        self._count("cache_misses")
         return None
 
     def set(self, url: str, data: Any):
         key = self._get_key(url)
-        self.cache[key] = (data, time.time())
\ No newline at end of file
+        blob = zlib.compress(json.dumps(data).encode())
+        now = time.time()
+        # An upsert rather than INSERT OR REPLACE: REPLACE deletes without
+        # firing the delete trigger, which would leave the byte total stale
+        self.conn.execute(
+            """INSERT INTO cache VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET data = excluded.data, size = excluded.size,
+                   created = excluded.created, accessed = excluded.accessed""",
+            (key, blob, len(blob), now, now))
+        self.evict()
+        self.conn.commit()
+
+    def _delete(self, key: str):
+        self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones, until under budget
+
+        Runs inside the caller's write transaction, so the total it reads
+        includes every other process's committed pages.
+        """
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        cutoff = time.time() - self.ttl
+        expired = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE created < ?",
+            (cutoff,)).fetchone()
+        self.conn.execute("DELETE FROM cache WHERE created < ?", (cutoff,))
+        total -= expired[1]
+        self._count("cache_evictions", expired[0])
+
+        victims = []
+        if total > self.max_bytes:
+            for key, size in self.conn.execute(
+                    "SELECT key, size FROM cache ORDER BY accessed"):
+                victims.append((key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self.conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+        self._count("cache_evictions", len(victims))
+
+    def close(self):
+        self.conn.close()
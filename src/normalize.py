@@ -0,0 +1,63 @@
+from typing import List, Dict, Optional
+import numpy as np
+import pandas as pd
+
+NUMERIC_FIELDS = {
+    "price": "price_value",
+    "original_price": "original_price_value",
+    "rating": "rating_value",
+    "reviews_count": "reviews_count_value",
+}
+
+_MULTIPLIERS = {"K": 1e3, "M": 1e6}
+
+
+def parse_numbers(values: pd.Series) -> pd.Series:
+    """Parse strings like "$1,199.99", "4.1 out of 5 stars" or "3.9K" into floats"""
+    parts = (values.astype("string")
+             .str.replace(",", "", regex=False)
+             .str.extract(r"(\d+(?:\.\d+)?)\s*([KkMm])?"))
+    numbers = pd.to_numeric(parts[0], errors="coerce")
+    multipliers = parts[1].str.upper().map(_MULTIPLIERS).astype("float").fillna(1.0)
+    return numbers * multipliers
+
+
+def normalize_products(products: List[Dict]) -> List[Dict]:
+    """Add numeric price, rating, review count and discount fields to a batch"""
+    if not products:
+        return products
+    df = pd.DataFrame(products)
+    for field, numeric_field in NUMERIC_FIELDS.items():
+        source = df[field] if field in df else pd.Series(None, index=df.index, dtype="object")
+        df[numeric_field] = parse_numbers(source)
+    df["reviews_count_value"] = df["reviews_count_value"].round().astype("Int64")
+    original = df["original_price_value"].where(df["original_price_value"] > 0)  # No discount off a zero price
+    df["discount_percent"] = ((original - df["price_value"]) / original * 100).round(1)
+
+    numeric = df[[*NUMERIC_FIELDS.values(), "discount_percent"]]
+    numeric = numeric.astype(object).where(numeric.notna(), None)
+    for product, values in zip(products, numeric.to_dict("records")):
+        product.update(values)
+        product["sponsored"] = bool(product.get("sponsored"))
+    return products
+
+
+def filter_products(products: List[Dict], min_rating: float = 4.0,
+                    exclude_sponsored: bool = True,
+                    min_price: Optional[float] = None,
+                    max_price: Optional[float] = None) -> List[Dict]:
+    """Select normalized products by rating, sponsorship and price band"""
+    if not products:
+        return []
+    df = pd.DataFrame(products).reindex(
+        columns=["rating_value", "price_value", "sponsored"])
+    ratings = pd.to_numeric(df["rating_value"], errors="coerce")
+    prices = pd.to_numeric(df["price_value"], errors="coerce")
+    mask = ratings.fillna(0).to_numpy() >= min_rating
+    if exclude_sponsored:
+        mask &= ~df["sponsored"].eq(True).to_numpy()
+    if min_price is not None:
+        mask &= (prices >= min_price).to_numpy()
+    if max_price is not None:
+        mask &= (prices <= max_price).to_numpy()
+    return [products[i] for i in np.flatnonzero(mask)]
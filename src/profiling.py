@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """Record spans as Chrome trace events (open the file in chrome://tracing or Perfetto)
+
+    Spans running in an asyncio task are drawn on a track per task, other
+    spans on a track per thread. Without a path the tracer is disabled and
+    ``span`` returns a shared no-op context.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_every: int = 1000):
+        self.path = path
+        self.enabled = path is not None
+        self.flush_every = flush_every
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.tids: Dict[object, int] = {}
+        self.events: List[Dict] = []
+        self.lock = threading.Lock()
+        self.file = None
+        self.written = 0
+
+    def _get_tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = task or threading.get_ident()
+        tid = self.tids.get(key)
+        if tid is None:
+            tid = self.tids[key] = len(self.tids) + 1
+            name = task.get_name() if task else threading.current_thread().name
+            self._emit({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                        "args": {"name": name}})
+        return tid
+
+    def _emit(self, event: Dict):
+        with self.lock:
+            self.events.append(event)
+            if len(self.events) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self.file is None:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self.file.write("[\n")
+        for event in self.events:
+            self.file.write((",\n" if self.written else "") + json.dumps(event))
+            self.written += 1
+        self.events.clear()
+        self.file.flush()
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, args)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, args: Dict):
+        tid = self._get_tid()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            self._emit({"name": name, "ph": "X", "pid": self.pid, "tid": tid,
+                        "ts": round((started - self.origin) * 1e6, 1),
+                        "dur": round((ended - started) * 1e6, 1), "args": args})
+
+    def close(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            self._flush()
+            self.file.write("\n]\n")
+            self.file.close()
+            self.enabled = False
+
+
+class Profiler:
+    """Opt-in profilers for a run, writing their output into the run folder
+
+    - ``profile.pstats``: cProfile of the event loop thread
+    - ``profile.collapsed``: stacks of every thread sampled every
+      ``sample_interval`` seconds, in the collapsed format read by
+      flamegraph.pl, speedscope and inferno
+    - ``memory_snapshots.txt`` / ``memory.snapshot``: top tracemalloc
+      allocation sites every ``memory_interval`` seconds, and the final
+      snapshot for ``tracemalloc.Snapshot.load``
+    """
+
+    def __init__(self, output_folder: str, cpu: bool = True, sample_interval: float = 0.01,
+                 memory_interval: float = 0, memory_top: int = 25):
+        self.output_folder = output_folder
+        self.cpu = cpu
+        self.sample_interval = sample_interval
+        self.memory_interval = memory_interval
+        self.memory_top = memory_top
+        self.profile = cProfile.Profile() if cpu else None
+        self.stacks: collections.Counter = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.memory_interval:
+            tracemalloc.start(10)
+        if self.profile:
+            self.profile.enable()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(os.path.join(self.output_folder, "profile.pstats"))
+            with open(os.path.join(self.output_folder, "profile.collapsed"), "w") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        if self.memory_interval:
+            self.snapshot_memory()
+            tracemalloc.take_snapshot().dump(
+                os.path.join(self.output_folder, "memory.snapshot"))
+            tracemalloc.stop()
+
+    def _run(self):
+        next_memory = time.monotonic() + self.memory_interval
+        interval = self.sample_interval if self.cpu else self.memory_interval
+        while not self.stopped.wait(interval):
+            if self.cpu:
+                self.sample_stacks()
+            if self.memory_interval and time.monotonic() >= next_memory:
+                self.snapshot_memory()
+                next_memory += self.memory_interval
+
+    def sample_stacks(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                stack.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def snapshot_memory(self):
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:self.memory_top]
+        current, peak = tracemalloc.get_traced_memory()
+        with open(os.path.join(self.output_folder, "memory_snapshots.txt"), "a") as f:
+            f.write(f"# {datetime.datetime.now().isoformat(timespec='seconds')} "
+                    f"current={current / 1024:.0f} KB peak={peak / 1024:.0f} KB\n")
+            for stat in stats:
+                f.write(f"{stat}\n")
+            f.write("\n")
@@ -0,0 +1,251 @@
+import base64
+import functools
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, quote, unquote
+from .database import PRODUCT_COLUMNS, get_columns
+
+SORT_COLUMNS = {"price": "price_value", "rating": "rating_value",
+                "reviews": "reviews_count_value", "discount": "discount_percent"}
+FILTERS = {
+    "min_price": ("price_value", ">="),
+    "max_price": ("price_value", "<="),
+    "min_rating": ("rating_value", ">="),
+    "min_reviews": ("reviews_count_value", ">="),
+    "min_discount": ("discount_percent", ">="),
+}
+MAX_LIMIT = 500
+
+
+def encode_cursor(key, rowid: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key, rowid]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    try:
+        key, rowid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return key, int(rowid)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def get_match_expression(text: str) -> str:
+    """Quote every word of free text so FTS5 matches all of them literally"""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+@functools.lru_cache(maxsize=256)
+def build_search_sql(text: bool, filters: Tuple[str, ...], sort: str,
+                     descending: bool, after: bool) -> str:
+    """SQL of one query shape; the same text for the same shape keeps it in the statement cache"""
+    where = []
+    if sort == "relevance":
+        source = ("(SELECT rowid AS id, bm25(products_fts) AS sort_key FROM products_fts "
+                  "WHERE products_fts MATCH :text) AS hits JOIN products p ON p.rowid = hits.id")
+        key = "hits.sort_key"
+    else:
+        source = "products p"
+        key = f"p.{SORT_COLUMNS[sort]}"
+        where.append(f"{key} IS NOT NULL")
+        if text:
+            where.append("p.rowid IN (SELECT rowid FROM products_fts "
+                         "WHERE products_fts MATCH :text)")
+    for name in filters:
+        column, operator = FILTERS[name]
+        where.append(f"p.{column} {operator} :{name}")
+    if after:
+        operator = "<" if descending else ">"
+        where.append(f"({key} {operator} :after_key "
+                     f"OR ({key} = :after_key AND p.rowid {operator} :after_id))")
+    order = "DESC" if descending else "ASC"
+    sql = (f"SELECT {', '.join(f'p.{c}' for c in PRODUCT_COLUMNS)}, "
+           f"{key} AS sort_key, p.rowid AS id FROM {source}")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + f" ORDER BY {key} {order}, p.rowid {order} LIMIT :limit"
+
+
+class ProductQuery:
+    """Read-side queries over a products database: full-text and numeric search
+
+    Titles are searched through the FTS5 index and prices, ratings, review
+    counts and discounts through their column indexes. Pages are fetched
+    with keyset cursors, so page 1000 costs the same as page 1. Each
+    thread gets its own read-only connection whose statement cache keeps
+    the compiled SQL of every query shape.
+    """
+
+    def __init__(self, db_path: str, statement_cache_size: int = 256,
+                 mmap_size: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.statement_cache_size = statement_cache_size
+        self.mmap_size = mmap_size
+        self.local = threading.local()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+        self.check_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True,
+                                   check_same_thread=False,
+                                   cached_statements=self.statement_cache_size)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def check_schema(self):
+        """Refuse databases written before the numeric columns and search index existed
+
+        The service only reads, so older databases have to be migrated
+        explicitly first.
+        """
+        conn = self.connect()
+        missing = [column for column in PRODUCT_COLUMNS
+                   if column not in get_columns(conn, "products")]
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone():
+            missing.append("products_fts")
+        if missing:
+            self.close()
+            raise ValueError(f"{self.db_path} was written by an older version (missing "
+                             f"{', '.join(missing)}); migrate it with "
+                             f"python main.py --migrate {self.db_path}")
+
+    def search(self, text: Optional[str] = None, sort: Optional[str] = None,
+               descending: bool = False, limit: int = 50, cursor: Optional[str] = None,
+               **filters) -> Dict:
+        """Return one page of products as ``{"items": [...], "next_cursor": ...}``
+
+        ``sort`` is one of price, rating, reviews, discount or relevance
+        (the default with ``text``); products without a value for the sort
+        column are left out. Filters: min_price, max_price, min_rating,
+        min_reviews and min_discount.
+        """
+        text = get_match_expression(text) if text else None
+        sort = sort or ("relevance" if text else "price")
+        if sort != "relevance" and sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort: {sort}")
+        if sort == "relevance" and not text:
+            raise ValueError("Sorting by relevance needs a search text")
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        filters = {name: float(value) for name, value in filters.items() if value is not None}
+        limit = max(1, min(int(limit), MAX_LIMIT))
+
+        params = {"text": text, "limit": limit + 1, **filters}
+        if cursor:
+            params["after_key"], params["after_id"] = decode_cursor(cursor)
+        sql = build_search_sql(bool(text), tuple(sorted(filters)), sort, descending,
+                               bool(cursor))
+        rows = self.connect().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["id"])
+        return {"items": [{column: row[column] for column in PRODUCT_COLUMNS} for row in rows],
+                "next_cursor": next_cursor}
+
+    def get(self, asin: str) -> Optional[Dict]:
+        row = self.connect().execute(
+            f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products WHERE asin = ?",
+            (asin,)).fetchone()
+        return dict(row) if row else None
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+
+
+class QueryServer:
+    """Serve a ProductQuery as JSON over HTTP
+
+    - ``GET /products?q=...&min_price=...&sort=rating&order=desc&limit=50&cursor=...``
+    - ``GET /products/<asin>``
+    """
+
+    def __init__(self, query: ProductQuery, host: str = "127.0.0.1", port: int = 8080):
+        self.query = query
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_json(self, status: int, data):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.rstrip("/")
+                try:
+                    if path == "/products":
+                        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                        order = params.pop("order", "asc")
+                        if order not in ("asc", "desc"):
+                            raise ValueError(f"Unknown order: {order}")
+                        self.send_json(200, server.query.search(
+                            text=params.pop("q", None), sort=params.pop("sort", None),
+                            descending=order == "desc",
+                            limit=params.pop("limit", 50),
+                            cursor=params.pop("cursor", None), **params))
+                    elif path.startswith("/products/"):
+                        product = server.query.get(unquote(path[len("/products/"):]))
+                        if product is None:
+                            self.send_json(404, {"error": "Product not found"})
+                        else:
+                            self.send_json(200, product)
+                    else:
+                        self.send_json(404, {"error": "Not found"})
+                except (ValueError, sqlite3.OperationalError) as e:
+                    self.send_json(400, {"error": str(e)})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
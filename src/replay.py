@@ -0,0 +1,204 @@
+import hashlib
+import html
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs, quote_plus
+
+
+def get_replay_key(url: str) -> str:
+    """Recordings are matched on path and query only, so any host can replay them"""
+    parsed = urlparse(url)
+    return f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+
+
+class PageRecorder:
+    """Save rendered HTML per URL so a run can later be replayed offline"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_filename = os.path.join(directory, "index.jsonl")
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, url: str, page_html: str):
+        filename = hashlib.sha1(url.encode()).hexdigest() + ".html"
+        with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as f:
+            f.write(page_html or "")
+        with self.lock, open(self.index_filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "file": filename}) + "\n")
+
+    @staticmethod
+    def load_index(directory: str) -> Dict[str, str]:
+        """Map replay keys to recorded HTML files"""
+        index = {}
+        index_filename = os.path.join(directory, "index.jsonl")
+        if os.path.exists(index_filename):
+            with open(index_filename, encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    index[get_replay_key(entry["url"])] = os.path.join(directory, entry["file"])
+        return index
+
+
+def render_search_page(keyword: str, page: int, pages_per_keyword: int,
+                       products_per_page: int) -> str:
+    """Build a synthetic search results page matching the extraction schema"""
+    items = []
+    for i in range(products_per_page):
+        n = (page - 1) * products_per_page + i
+        asin = "B" + hashlib.md5(f"{keyword}-{n}".encode()).hexdigest()[:9].upper()
+        price = 50 + (n * 37) % 950
+        sponsored = '<span class="puis-sponsored-label-text">Sponsored</span>' if n % 7 == 0 else ""
+        items.append(f"""
+<div data-component-type="s-search-result" data-asin="{asin}">
+  {sponsored}
+  <h2><a href="/{quote_plus(keyword)}-Phone-{n}/dp/{asin}/ref=sr_1_{i + 1}"><span>{html.escape(keyword)} Phone {n}</span></a></h2>
+  <img class="s-image" src="https://m.media-amazon.com/images/I/{asin}._AC_UY218_.jpg">
+  <i class="a-icon-star-small"><span class="a-icon-alt">{3 + (n % 20) / 10:.1f} out of 5 stars</span></i>
+  <span data-csa-c-func-deps="aui-da-a-popover"></span><span><span>{(n * 131) % 20000:,}</span></span>
+  <span class="a-price"><span class="a-offscreen">${price}.99</span></span>
+  <span class="a-price a-text-price"><span class="a-offscreen">${price + 50}.99</span></span>
+  <div data-cy="delivery-recipe"><span class="a-color-base">FREE delivery</span></div>
+</div>""")
+    pagination = ""
+    if page < pages_per_keyword:
+        pagination = (f'<a class="s-pagination-item s-pagination-next" '
+                      f'href="/s?k={quote_plus(keyword)}&page={page + 1}&ref=sr_pg_{page}">Next</a>')
+    return (f"<html><head><title>Amazon.com : {html.escape(keyword)}</title></head><body>"
+            f"{''.join(items)}<div class=\"s-pagination-container\">{pagination}</div>"
+            f"</body></html>")
+
+
+def render_detail_page(asin: str) -> str:
+    """Build a synthetic product detail page matching the detail schema"""
+    n = int(hashlib.md5(asin.encode()).hexdigest()[:8], 16)
+    price = 50 + n % 950
+    availability = "Currently unavailable." if n % 5 == 0 else "In Stock"
+    features = "".join(f'<li><span class="a-list-item">Feature {i} of {asin}</span></li>'
+                       for i in range(1 + n % 4))
+    specs = "".join(f"<tr><th>{name}</th><td>{value}</td></tr>" for name, value in (
+        ("Brand", f"Brand {n % 10}"), ("Memory", f"{2 ** (2 + n % 4)} GB"),
+        ("Weight", f"{100 + n % 200} g")))
+    variants = "".join(
+        f'<li data-defaultasin="{asin[:-1]}{i}" title="Click to select Color {i}"></li>'
+        for i in range(n % 3))
+    return f"""<html><head><title>Amazon.com: Product {asin}</title></head><body>
+<div id="dp">
+  <input type="hidden" id="ASIN" value="{asin}">
+  <span id="productTitle">Product {asin}</span>
+  <a id="bylineInfo" href="/stores/brand">Visit the Brand {n % 10} Store</a>
+  <div id="corePrice_feature_div"><span class="a-offscreen">${price}.99</span></div>
+  <span id="acrPopover" title="{3 + (n % 20) / 10:.1f} out of 5 stars"></span>
+  <span id="acrCustomerReviewText">{n % 20000:,} ratings</span>
+  <div id="availability"><span>{availability}</span></div>
+  <a id="sellerProfileTriggerId" href="/sp">Seller {n % 50}</a>
+  <div id="feature-bullets"><ul>{features}</ul></div>
+  <table id="productDetails_techSpec_section_1">{specs}</table>
+  <div id="twister"><ul>{variants}</ul></div>
+</div></body></html>"""
+
+
+CAPTCHA_PAGE = ("<html><body><form action=\"/errors/validateCaptcha\">"
+                "<input id=\"captchacharacters\" name=\"field-keywords\" type=\"text\">"
+                "</form></body></html>")
+
+
+class ReplayServer:
+    """Local stand-in for amazon.com serving recorded or synthetic search and detail pages"""
+
+    def __init__(self, recordings_path: Optional[str] = None, host: str = "127.0.0.1",
+                 port: int = 0, pages_per_keyword: int = 5, products_per_page: int = 20,
+                 captcha_rate: float = 0.0, latency: float = 0.0):
+        self.recordings = PageRecorder.load_index(recordings_path) if recordings_path else {}
+        self.pages_per_keyword = pages_per_keyword
+        self.products_per_page = products_per_page
+        self.captcha_rate = captcha_rate
+        self.latency = latency
+        self.requests_served = 0
+        self.captchas_served = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/s?k="
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def is_captcha(self, key: str) -> bool:
+        # Deterministic per URL and attempt, so retries can get through
+        if not self.captcha_rate:
+            return False
+        digest = hashlib.md5(f"{key}#{self.requests_served}".encode()).digest()
+        return int.from_bytes(digest[:4], "little") / 2 ** 32 < self.captcha_rate
+
+    def render(self, path: str) -> Optional[str]:
+        key = get_replay_key(path)
+        if key in self.recordings:
+            with open(self.recordings[key], encoding="utf-8") as f:
+                return f.read()
+        parsed = urlparse(path)
+        parts = parsed.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "dp":
+            if self.is_captcha(key):
+                self.captchas_served += 1
+                return CAPTCHA_PAGE
+            return render_detail_page(parts[1])
+        if parsed.path.rstrip("/") != "/s":
+            return None
+        query = parse_qs(parsed.query)
+        keyword = query.get("k", [""])[0]
+        try:
+            page = int(query.get("page", ["1"])[0])
+        except ValueError:
+            page = 1
+        if not keyword or page > self.pages_per_keyword:
+            return None
+        if self.is_captcha(key):
+            self.captchas_served += 1
+            return CAPTCHA_PAGE
+        return render_search_page(keyword, page, self.pages_per_keyword,
+                                  self.products_per_page)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                with server.lock:
+                    server.requests_served += 1
+                body = server.render(self.path)
+                status = 200 if body is not None else 404
+                data = (body or "<html><body>Not Found</body></html>").encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
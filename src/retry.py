@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Optional
+from .models import ScraperMetrics
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """A failed page fetch, classified so the retry policy can react to its cause"""
+    kind = "network"
+
+    @property
+    def retryable(self) -> bool:
+        return True
+
+    @property
+    def blocking(self) -> bool:
+        """Whether the error suggests the endpoint is overloaded or blocking us"""
+        return True
+
+
+class NetworkError(FetchError):
+    kind = "network"
+
+
+class HttpError(FetchError):
+    kind = "http"
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUS
+
+    @property
+    def blocking(self) -> bool:
+        return self.status in RETRYABLE_STATUS
+
+
+class CaptchaError(FetchError):
+    kind = "captcha"
+
+
+class ExtractionError(FetchError):
+    kind = "extraction"
+
+    @property
+    def blocking(self) -> bool:
+        return False
+
+
+def classify(error: Exception) -> FetchError:
+    """Wrap an arbitrary exception from a fetch as a FetchError"""
+    if isinstance(error, FetchError):
+        return error
+    wrapped = NetworkError(f"{type(error).__name__}: {str(error)}")
+    wrapped.__cause__ = error
+    return wrapped
+
+
+class RetryBudget:
+    """Allow retries up to a fraction of first attempts, plus a small reserve
+
+    Every first attempt deposits ``ratio`` tokens and every retry withdraws
+    one, so when most requests fail the retries stop instead of multiplying
+    the traffic.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: int = 10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = float(reserve)
+        self.capacity = float(max(reserve, 100))
+
+    def deposit(self):
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class CircuitBreaker:
+    """Closed, open or half-open state of one host or proxy
+
+    After ``failure_threshold`` consecutive blocking failures the breaker
+    opens and requests wait for ``reset_timeout`` seconds. A single probe
+    is then let through: success closes the breaker, failure reopens it
+    with the timeout doubled up to ``max_reset_timeout``.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30,
+                 max_reset_timeout: float = 600):
+        self.failure_threshold = failure_threshold
+        self.base_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0
+
+    def get_delay(self) -> float:
+        """Seconds to wait before a request may go out; 0 lets it through"""
+        if self.state == self.CLOSED:
+            return 0.0
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.timeout - now
+            if remaining > 0:
+                return remaining
+            self.state = self.HALF_OPEN
+            self.probing = False
+        if not self.probing:
+            self.probing = True
+            return 0.0
+        return min(1.0, self.timeout)  # Wait for the probe's outcome
+
+    def record(self, success: bool):
+        if success:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.timeout = self.base_timeout
+        else:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.timeout = min(self.max_reset_timeout, self.timeout * 2)
+                self.open()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.open()
+        self.probing = False
+
+    def release(self):
+        """Give up a probe slot without an outcome (e.g. the request was cancelled)"""
+        self.probing = False
+
+    def open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() < self.opened_at + self.timeout
+
+
+class RetryPolicy:
+    """Decide whether and when to retry a fetch, and gate requests per host and proxy
+
+    Breakers are keyed by strings such as ``host:www.amazon.com`` or
+    ``proxy:http://proxy1.com:8080``.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 5, max_delay: float = 60,
+                 budget_ratio: float = 0.2, budget_reserve: int = 10,
+                 failure_threshold: int = 5, reset_timeout: float = 30,
+                 max_reset_timeout: float = 600,
+                 metrics: Optional[ScraperMetrics] = None):
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget(budget_ratio, budget_reserve)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get_breaker(self, key: str) -> CircuitBreaker:
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker(
+                self.failure_threshold, self.reset_timeout, self.max_reset_timeout)
+        return breaker
+
+    def _count(self, field: str, amount: int = 1):
+        if self.metrics is not None:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
+
+    def is_available(self, key: str) -> bool:
+        return not self.get_breaker(key).is_open
+
+    def get_backoff(self, previous: Optional[float]) -> float:
+        """Decorrelated jitter: uniform between the base delay and three times the last one"""
+        previous = previous or self.base_delay
+        return min(self.max_delay, random.uniform(self.base_delay, previous * 3))
+
+    def should_retry(self, error: FetchError, attempt: int) -> bool:
+        """Whether attempt number ``attempt`` (1-based) may be followed by another"""
+        if attempt >= self.max_retries or not error.retryable:
+            return False
+        if not self.budget.withdraw():
+            self._count("retries_denied")
+            return False
+        self._count("retries")
+        return True
+
+    async def wait_for(self, key: str) -> float:
+        """Wait while the breaker of ``key`` is open, returning the time waited"""
+        breaker = self.get_breaker(key)
+        waited = 0.0
+        delay = breaker.get_delay()
+        if delay > 0:
+            self._count("circuit_breaker_waits")
+        while delay > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = breaker.get_delay()
+        return waited
+
+    def record(self, key: str, error: Optional[FetchError]):
+        """Record a request's outcome on the breaker of ``key``"""
+        breaker = self.get_breaker(key)
+        trips = breaker.trips
+        breaker.record(error is None or not error.blocking)
+        if breaker.trips > trips:
+            self._count("circuit_breaker_trips")
+            logging.warning(f"Circuit breaker for {key} opened for {breaker.timeout:.0f}s "
+                            f"after {breaker.failures} failures")
+
+    def get_report(self) -> Dict[str, Dict]:
+        return {key: {"state": b.state, "trips": b.trips, "failures": b.failures}
+                for key, b in self.breakers.items() if b.trips or b.state != b.CLOSED}
@@ -1,55 +1,144 @@
-import sqlite3
-from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import contextlib
 import json
 import logging
-import random
 import os
 import datetime
+import functools
+import itertools
+import random
 import time
-import pandas as pd
-from typing import List, Dict
-from crawl4ai import AsyncWebCrawler
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
 from crawl4ai.extraction_strategy import JsonCssExtractionStrategy
 from crawl4ai.async_configs import BrowserConfig, CrawlerRunConfig, CacheMode
 from src.config import ScraperConfig
 from .models import ScraperMetrics, Cache
-from .utils import RateLimiter, Dashboard
-from .database import Database
+from .utils import RateLimiter, Dashboard, SingleFlight, canonicalize_url
+from .sinks import (ResultPipeline, JsonlSink, CsvSink, MarkdownSink, SQLiteSink,
+                    ParquetSink, ArchiveSink)
+from .frontier import CrawlFrontier, FrontierEntry, get_search_keyword, read_keywords
+from .browser_pool import BrowserPool
+from .normalize import normalize_products, filter_products
+from .replay import PageRecorder
+from .fetcher import HttpFetcher, CssSchemaExtractor
+from .journal import CrawlJournal, IN_FLIGHT, DONE, FAILED
+from .changes import ChangeTracker, PendingChanges
+from .telemetry import MetricsServer, SnapshotWriter, StageMetrics
+from .profiling import Tracer, Profiler
+from .images import ImageStore, ImageFetcher
+from .concurrency import ConcurrencyLimiter, AIMDController
+from .details import DETAIL_SCHEMA, DetailJob, DetailQueue, parse_details
+from .retry import (RetryPolicy, FetchError, NetworkError, HttpError, CaptchaError,
+                    ExtractionError, classify)
+
+
+@dataclass
+class FetchStage:
+    """Limits and extraction of one kind of page, such as search results or product details"""
+    name: str
+    limiter: ConcurrencyLimiter
+    rate_limiter: RateLimiter
+    controller: Optional[AIMDController]
+    crawler_config: Any  # CrawlerRunConfig of the browser engine
+    extractor: Optional[CssSchemaExtractor] = None  # HTTP engine, None = its default schema
 
 
 class AmazonScraper:
     def __init__(self, config: ScraperConfig):
         self.config = config
-        self.timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-        self.output_folder = f"Results/amazon_scrape_{self.timestamp}"
+        self.timestamp = self.config.timestamp
+        self.output_folder = self.config.output_folder
         self.setup_directories()
         self.setup_files()
         self.setup_logging()
         self.setup_metrics()
 
-        self.cache = Cache(ttl=self.config.cache_ttl)
+        self.cache = Cache(ttl=self.config.cache_ttl,
+                           path=self.config.cache_path,
+                           max_bytes=self.config.cache_max_bytes,
+                           metrics=self.metrics)
         self.rate_limiter = RateLimiter(
-            requests_per_second=self.config.requests_per_second)
-        self.semaphore = asyncio.Semaphore(self.config.max_concurrent_requests)
-
-        self.keywords = ["Samsung", "Apple", "Honor",
-                         "Huawei", "OnePlus", "Xiaomi", "Google Pixel"]
-        self.base_url = "https://www.amazon.com/s?k="
-        self.search_urls = [
-            f"{self.base_url}{keyword.replace(' ', '+')}" for keyword in self.keywords]
+            requests_per_second=self.config.requests_per_second,
+            burst=self.config.rate_limit_burst,
+            host_requests_per_second=self.config.host_requests_per_second)
+        self.concurrency_limiter = ConcurrencyLimiter(self.config.max_concurrent_requests)
+        self.concurrency_controller = self.create_controller(
+            self.concurrency_limiter, self.rate_limiter, self.config.adaptive_max_concurrency)
+        self.inflight = SingleFlight()
+        self.retry_policy = RetryPolicy(
+            max_retries=self.config.max_retries,
+            base_delay=self.config.retry_delay,
+            max_delay=self.config.retry_max_delay,
+            budget_ratio=self.config.retry_budget_ratio,
+            budget_reserve=self.config.retry_budget_reserve,
+            failure_threshold=self.config.breaker_failure_threshold,
+            reset_timeout=self.config.breaker_reset_timeout,
+            max_reset_timeout=self.config.breaker_max_reset_timeout,
+            metrics=self.metrics)
+        self.tracer = Tracer(os.path.join(self.output_folder, "trace.json")
+                             if self.config.enable_tracing else None)
+        self.recorder = PageRecorder(
+            self.config.record_html_path) if self.config.record_html_path else None
+        self.journal = CrawlJournal(
+            self.journal_filename) if self.config.enable_journal else None
+        self.change_tracker = ChangeTracker(
+            self.config.change_state_path,
+            min_interval=self.config.recrawl_min_interval,
+            max_interval=self.config.recrawl_max_interval,
+            metrics=self.metrics) if self.config.enable_change_detection else None
+        self.image_fetcher = ImageFetcher(
+            ImageStore(self.config.image_store_path),
+            concurrency=self.config.image_concurrency,
+            max_pending=self.config.image_queue_size,
+            revalidate_after=self.config.image_revalidate_after,
+            max_bytes=self.config.image_max_bytes,
+            timeout=self.config.timeout,
+            seen_capacity=self.config.seen_set_capacity,
+            metrics=self.metrics,
+            stages=self.metrics.stages) if self.config.enable_image_downloads else None
+
+        self.keywords = self.config.keywords
+        self.keywords_fed = 0
+        self.keywords_skipped = 0
+        self.base_url = self.config.base_url
+        self.frontier: Optional[CrawlFrontier] = None
+        self.details: Optional[DetailQueue] = None
         self.setup_proxies_and_agents()
         self.setup_configs()
 
+    def create_controller(self, limiter: ConcurrencyLimiter, rate_limiter: RateLimiter,
+                          max_limit: int, gauge_prefix: str = "") -> Optional[AIMDController]:
+        """AIMD controller of one stage's limits, or None without adaptive concurrency"""
+        if not self.config.enable_adaptive_concurrency:
+            return None
+        return AIMDController(
+            limiter, rate_limiter,
+            min_limit=self.config.adaptive_min_concurrency,
+            max_limit=max_limit,
+            min_rate=self.config.adaptive_min_rate,
+            max_rate=self.config.adaptive_max_rate,
+            interval=self.config.adaptive_interval,
+            latency_tolerance=self.config.adaptive_latency_tolerance,
+            error_threshold=self.config.adaptive_error_threshold,
+            captcha_threshold=self.config.adaptive_captcha_threshold,
+            metrics=self.metrics, gauge_prefix=gauge_prefix)
+
     def setup_directories(self):
         """Set up necessary directories"""
         os.makedirs(self.output_folder, exist_ok=True)
         os.makedirs(self.config.downloads_path, exist_ok=True)
+        os.makedirs(os.path.dirname(self.config.cache_path) or ".", exist_ok=True)
+        if self.config.enable_change_detection:
+            os.makedirs(os.path.dirname(self.config.change_state_path) or ".", exist_ok=True)
+        if self.config.enable_detail_pages:
+            os.makedirs(os.path.dirname(self.config.detail_state_path) or ".", exist_ok=True)
 
     def setup_files(self):
         """Initialize file paths"""
         self.json_filename = os.path.join(
-            self.output_folder, "amazon_products.json")
+            self.output_folder, "amazon_products.jsonl")
         self.csv_filename = os.path.join(
             self.output_folder, "amazon_products.csv")
         self.db_filename = os.path.join(
@@ -58,11 +147,16 @@ class AmazonScraper:
             self.output_folder, "amazon_products.md")
         self.log_filename = os.path.join(self.output_folder, "scraper.log")
         self.links_filename = os.path.join(
-            self.output_folder, "extracted_links.json")
+            self.output_folder, "extracted_links")  # Archive base name
         self.media_filename = os.path.join(
-            self.output_folder, "extracted_media.json")
+            self.output_folder, "extracted_media")
         self.metrics_filename = os.path.join(
             self.output_folder, "metrics.json")
+        self.snapshots_filename = os.path.join(
+            self.output_folder, "metrics_snapshots.jsonl")
+        self.journal_filename = os.path.join(self.output_folder, "journal.jsonl")
+        self.details_filename = os.path.join(
+            self.output_folder, "amazon_product_details.jsonl")
 
     def setup_logging(self):
         """Configure logging"""
@@ -70,7 +164,7 @@ class AmazonScraper:
             logging.basicConfig(
                 level=logging.INFO,
                 filename=self.log_filename,
-                filemode="w",
+                filemode="a" if self.config.resume else "w",
                 format="%(asctime)s - %(levelname)s - %(message)s"
             )
             # Add console handler
@@ -80,7 +174,8 @@ class AmazonScraper:
 
     def setup_metrics(self):
         """Initialize metrics tracking"""
-        self.metrics = ScraperMetrics(start_time=time.time())
+        self.metrics = ScraperMetrics(start_time=time.time(), stages=StageMetrics(
+            label_limits={"keyword": self.config.metrics_keyword_labels}))
 
     def setup_proxies_and_agents(self):
         """Set up proxy and user agent lists"""
@@ -94,51 +189,66 @@ class AmazonScraper:
 
     def setup_configs(self):
         """Set up browser and crawler configurations"""
-        self.browser_config = BrowserConfig(
-            browser_type="chromium",
-            headless=True,
-            proxy=random.choice(
-                self.proxies) if self.config.enable_proxy_rotation else None,
-            user_agent=random.choice(
-                self.user_agents) if self.config.enable_user_agent_rotation else None,
-            verbose=True,
-            accept_downloads=self.config.enable_file_downloads,
-            downloads_path=self.config.downloads_path
+        self.browser_pool = BrowserPool(
+            make_config=self.create_browser_config,
+            proxies=self.proxies if self.config.enable_proxy_rotation else [None],
+            user_agents=self.user_agents if self.config.enable_user_agent_rotation else [None],
+            size=self.config.browser_pool_size,
+            max_failures=self.config.max_context_failures,
+            retire_on_captcha=self.config.enable_captcha_detection,
+            lazy=self.config.fetch_engine == "http",
+            is_available=lambda proxy: self.retry_policy.is_available(f"proxy:{proxy}")
         )
 
-        self.crawler_config = CrawlerRunConfig(
-            extraction_strategy=JsonCssExtractionStrategy(
-                schema={
-                    "name": "Amazon Product Search Results",
-                    "baseSelector": "[data-component-type='s-search-result']",
-                    "fields": [
-                        {"name": "asin", "selector": "",
-                            "type": "attribute", "attribute": "data-asin"},
-                        {"name": "title", "selector": "h2 a span", "type": "text"},
-                        {"name": "url", "selector": "h2 a",
-                            "type": "attribute", "attribute": "href"},
-                        {"name": "image", "selector": ".s-image",
-                            "type": "attribute", "attribute": "src"},
-                        {"name": "rating",
-                            "selector": ".a-icon-star-small .a-icon-alt", "type": "text"},
-                        {"name": "reviews_count",
-                            "selector": "[data-csa-c-func-deps='aui-da-a-popover'] ~ span span", "type": "text"},
-                        {"name": "price", "selector": ".a-price .a-offscreen",
-                            "type": "text"},
-                        {"name": "original_price",
-                            "selector": ".a-price.a-text-price .a-offscreen", "type": "text"},
-                        {"name": "sponsored",
-                            "selector": ".puis-sponsored-label-text", "type": "exists"},
-                        {"name": "delivery_info",
-                            "selector": "[data-cy='delivery-recipe'] .a-color-base", "type": "text", "multiple": True},
-                        {"name": "next_page", "selector": ".s-pagination-next",
-                            "type": "attribute", "attribute": "href"},
-                        {"name": "captcha_detected",
-                            "selector": "#captchacharacters", "type": "exists"},
-                    ],
-                }
-            ),
-            cache_mode=CacheMode.ENABLED,
+        self.extraction_schema = {
+            "name": "Amazon Product Search Results",
+            "baseSelector": "[data-component-type='s-search-result']",
+            "fields": [
+                {"name": "asin", "selector": "",
+                    "type": "attribute", "attribute": "data-asin"},
+                {"name": "title", "selector": "h2 a span", "type": "text"},
+                {"name": "url", "selector": "h2 a",
+                    "type": "attribute", "attribute": "href"},
+                {"name": "image", "selector": ".s-image",
+                    "type": "attribute", "attribute": "src"},
+                {"name": "rating",
+                    "selector": ".a-icon-star-small .a-icon-alt", "type": "text"},
+                {"name": "reviews_count",
+                    "selector": "[data-csa-c-func-deps='aui-da-a-popover'] ~ span span", "type": "text"},
+                {"name": "price", "selector": ".a-price .a-offscreen",
+                    "type": "text"},
+                {"name": "original_price",
+                    "selector": ".a-price.a-text-price .a-offscreen", "type": "text"},
+                {"name": "sponsored",
+                    "selector": ".puis-sponsored-label-text", "type": "exists"},
+                {"name": "delivery_info",
+                    "selector": "[data-cy='delivery-recipe'] .a-color-base", "type": "text", "multiple": True},
+                {"name": "next_page", "selector": ".s-pagination-next",
+                    "type": "attribute", "attribute": "href"},
+                {"name": "captcha_detected",
+                    "selector": "#captchacharacters", "type": "exists"},
+            ],
+        }
+
+        self.crawler_config = self.create_crawler_config(self.extraction_schema)
+        self.search_stage = FetchStage(
+            "search", self.concurrency_limiter, self.rate_limiter,
+            self.concurrency_controller, self.crawler_config)
+        self.detail_stage = self.create_detail_stage() if self.config.enable_detail_pages else None
+
+        self.http_fetcher = HttpFetcher(
+            schema=self.extraction_schema,
+            timeout=self.config.timeout,
+            max_redirects=self.config.max_redirects,
+            limit=self.config.http_connection_limit,
+            stages=self.metrics.stages
+        ) if self.config.fetch_engine == "http" else None
+
+    def create_crawler_config(self, schema: Dict) -> CrawlerRunConfig:
+        """Build the crawl4ai run configuration extracting one schema"""
+        return CrawlerRunConfig(
+            extraction_strategy=JsonCssExtractionStrategy(schema=schema),
+            cache_mode=getattr(CacheMode, self.config.browser_cache_mode.upper()),
             exclude_external_links=self.config.exclude_external_links,
             exclude_social_media_links=self.config.exclude_social_media_links,
             exclude_external_images=self.config.exclude_external_images,
@@ -147,6 +257,31 @@ class AmazonScraper:
             wait_for=self.config.wait_for_downloads
         )
 
+    def create_detail_stage(self) -> FetchStage:
+        """Detail page stage with its own limits, sharing the per-host cap with the search stage"""
+        limiter = ConcurrencyLimiter(self.config.detail_concurrency)
+        rate_limiter = RateLimiter(
+            requests_per_second=self.config.detail_requests_per_second,
+            burst=self.config.rate_limit_burst,
+            host_limiter=self.rate_limiter)
+        controller = self.create_controller(
+            limiter, rate_limiter, self.config.detail_max_concurrency, gauge_prefix="detail_")
+        return FetchStage("detail", limiter, rate_limiter, controller,
+                          self.create_crawler_config(DETAIL_SCHEMA),
+                          CssSchemaExtractor(DETAIL_SCHEMA))
+
+    def create_browser_config(self, proxy: str, user_agent: str) -> BrowserConfig:
+        """Build the browser configuration of one pooled context"""
+        return BrowserConfig(
+            browser_type="chromium",
+            headless=True,
+            proxy=proxy,
+            user_agent=user_agent,
+            verbose=True,
+            accept_downloads=self.config.enable_file_downloads,
+            downloads_path=self.config.downloads_path
+        )
+
     def print_startup_info(self):
         """Print startup information"""
         print("\n" + "="*80)
@@ -158,9 +293,13 @@ class AmazonScraper:
         print(
             f"🕒 Start Time: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"📁 Output Directory: {self.output_folder}")
-        print(f"🔍 Keywords to Scrape: {len(self.keywords)}")
+        if self.config.keywords_file:
+            print(f"🔍 Keywords File: {self.config.keywords_file}")
+        elif isinstance(self.keywords, (list, tuple)):
+            print(f"🔍 Keywords to Scrape: {len(self.keywords)}")
         print(f"🌐 Available Proxies: {len(self.proxies)}")
         print(f"👤 User Agents: {len(self.user_agents)}")
+        print(f"🧭 Browser Contexts: {self.config.browser_pool_size}")
 
         print("\n💾 OUTPUT FILES:")
         print("-"*80)
@@ -168,69 +307,252 @@ class AmazonScraper:
         print(f"📑 CSV Output: {self.csv_filename}")
         print(f"🗄️  Database: {self.db_filename}")
         print(f"📝 Log File: {self.log_filename}")
-        print(f"🔗 Links File: {self.links_filename}")
-        print(f"🖼️  Media File: {self.media_filename}")
+        print(f"🔗 Links Archive: {self.links_filename}-*.jsonl*")
+        print(f"🖼️  Media Archive: {self.media_filename}-*.jsonl*")
         print(f"📊 Metrics File: {self.metrics_filename}")
+        if self.journal:
+            print(f"📒 Journal: {self.journal_filename}")
+        if self.detail_stage and self.config.enable_json_output:
+            print(f"🔎 Product Details: {self.details_filename}")
 
-        print("\n🎯 TARGET KEYWORDS:")
-        print("-"*80)
-        for keyword in self.keywords:
-            print(f"  • {keyword}")
+        if isinstance(self.keywords, (list, tuple)) and not self.config.keywords_file:
+            print("\n🎯 TARGET KEYWORDS:")
+            print("-"*80)
+            for keyword in self.keywords:
+                print(f"  • {keyword}")
 
         print("\n" + "="*80 + "\n")
 
-    async def process_url_with_retry(self, url: str, crawler: AsyncWebCrawler) -> Dict:
-        """Process a URL with retry logic"""
-        for attempt in range(self.config.max_retries):
+    def detect_captcha(self, result, products: List[Dict]) -> bool:
+        # A CAPTCHA page has no search results for the schema to match,
+        # so also look for the CAPTCHA input in the raw HTML
+        return self.config.enable_captcha_detection and (
+            any(p.get("captcha_detected") for p in products)
+            or "captchacharacters" in (result.html or ""))
+
+    async def fetch_page(self, url: str, stage: Optional[FetchStage] = None):
+        """Fetch a URL with the configured engine, falling back to the browser
+
+        ``stage`` gives the limits and schema of the page, search results by default.
+        """
+        stage = stage or self.search_stage
+        if self.http_fetcher:
+            result, products, captcha = await self.fetch_page_http(url, stage)
+            # A CAPTCHA is retried by the caller, after its backoff and breaker wait
+            if captcha or (result.success and products):
+                return result, products, captcha
+            self.metrics.browser_fallbacks += 1
+            reason = result.error_message or "no products"
+            logging.info(f"Falling back to browser for {url} ({reason})")
+        return await self.fetch_page_browser(url, stage)
+
+    def get_labels(self, url: str, proxy: str) -> Dict[str, str]:
+        """Histogram labels of a request"""
+        return {"proxy": str(proxy), "keyword": get_search_keyword(url) or ""}
+
+    async def fetch_page_http(self, url: str, stage: FetchStage):
+        """Fetch a URL over plain HTTP and extract its items with lxml"""
+        stages = self.metrics.stages
+        proxy = self.browser_pool.choose_proxy()
+        labels = self.get_labels(url, proxy)
+        # Rate waits happen inside the slot, so at most the limit's worth of
+        # requests hold reservations and rate changes apply quickly
+        started = time.perf_counter()
+        async with stage.limiter:
+            stages.observe("semaphore_wait", time.perf_counter() - started, page_type=stage.name)
+            with stages.time("rate_limit_wait", proxy=labels["proxy"]):
+                await stage.rate_limiter.wait(host=urlparse(url).netloc, proxy=proxy)
+            fetch_started = time.perf_counter()
+            with stages.time("fetch", engine="http", page_type=stage.name, **labels):
+                result = await self.http_fetcher.fetch(
+                    url, proxy=proxy, user_agent=random.choice(self.browser_pool.user_agents),
+                    extractor=stage.extractor)
+            latency = time.perf_counter() - fetch_started
+        self.metrics.http_fetches += 1
+
+        products = json.loads(result.extracted_content) if result.success else []
+        captcha = self.detect_captcha(result, products)
+        if captcha or (result.success and products):
+            # Otherwise the browser fallback records the outcome of this attempt
+            self.browser_pool.health[proxy].record("captcha" if captcha else "success")
+            error = CaptchaError() if captcha else None
+            self.retry_policy.record(f"proxy:{proxy}", error)
+            if stage.controller:
+                stage.controller.record(latency, error)
+        if result.success and self.recorder:
+            self.recorder.save(url, result.html)
+        return result, products, captcha
+
+    def get_fetch_error(self, result) -> FetchError:
+        """Classify an unsuccessful crawl result"""
+        status = getattr(result, "status_code", None)
+        if status and status >= 400:
+            return HttpError(status, result.error_message)
+        return NetworkError(result.error_message or "Fetch failed")
+
+    async def fetch_page_browser(self, url: str, stage: FetchStage):
+        """Render a URL on a leased browser context and extract its items"""
+        stages = self.metrics.stages
+        started = time.perf_counter()
+        async with stage.limiter:
+            stages.observe("semaphore_wait", time.perf_counter() - started, page_type=stage.name)
+            if self.http_fetcher is None:
+                # A context for every fetch the limits admit, so the pool
+                # follows the adaptive limits instead of capping them
+                self.browser_pool.resize(self.get_browser_slots())
+            with stages.time("browser_acquire"):
+                context = await self.browser_pool.acquire()
+            labels = self.get_labels(url, context.proxy)
+            outcome = "error"
+            error = None
+            fetch_started = latency = None
             try:
-                self.metrics.total_requests += 1
-                await self.rate_limiter.wait()
-
-                # Check cache first
-                cached_data = self.cache.get(url)
-                if cached_data:
-                    self.metrics.successful_requests += 1
-                    return cached_data
-
-                async with self.semaphore:
-                    result = await crawler.arun(url=url, config=self.crawler_config)
+                with stages.time("rate_limit_wait", proxy=labels["proxy"]):
+                    await stage.rate_limiter.wait(host=urlparse(url).netloc,
+                                                  proxy=context.proxy)
+                fetch_started = time.perf_counter()
+                # Rendering includes crawl4ai's own schema extraction
+                with stages.time("fetch", engine="browser", page_type=stage.name, **labels):
+                    result = await context.crawler.arun(url=url, config=stage.crawler_config)
+                latency = time.perf_counter() - fetch_started
 
                 if not result.success:
-                    raise Exception(result.error_message)
-
-                products = json.loads(result.extracted_content)
+                    raise self.get_fetch_error(result)
+
+                if self.recorder:
+                    self.recorder.save(url, result.html)
+
+                with stages.time("extraction", engine="browser"):
+                    try:
+                        products = json.loads(result.extracted_content)
+                    except (TypeError, ValueError) as e:
+                        raise ExtractionError(f"Invalid extracted content: {str(e)}") from e
+                captcha = self.detect_captcha(result, products)
+                if captcha:
+                    outcome, error = "captcha", CaptchaError()
+                else:
+                    outcome = "success"
+                return result, products, captcha
+            except Exception as e:
+                error = classify(e)
+                raise
+            finally:
+                if outcome != "error" or error is not None:  # Not on cancellation
+                    self.retry_policy.record(f"proxy:{context.proxy}", error)
+                    if stage.controller and fetch_started is not None:
+                        stage.controller.record(
+                            latency or time.perf_counter() - fetch_started, error)
+                await self.browser_pool.release(context, outcome)
+
+    def get_browser_slots(self) -> int:
+        """Browser contexts needed for every fetch the stages' current limits admit"""
+        return sum(stage.limiter.limit for stage in (self.search_stage, self.detail_stage)
+                   if stage)
+
+    async def process_url(self, url: str) -> Dict:
+        """Process a URL, sharing the fetch of any concurrent request for the same page"""
+        key = canonicalize_url(url)
+        if key in self.inflight:
+            self.metrics.requests_coalesced += 1
+        return await self.inflight.run(key, lambda: self.process_url_with_retry(url))
+
+    async def process_url_with_retry(self, url: str) -> Dict:
+        """Process a URL with retry logic, returning its products and next page URLs
+
+        Failed attempts are classified and retried after a decorrelated
+        jitter backoff while the retry budget lasts. Requests wait while the
+        host's circuit breaker is open.
+        """
+        # Cache hits are not requests; only network fetches count
+        cached_data = self.cache.get(url)
+        if cached_data:
+            return cached_data
+
+        result, products = await self.fetch_with_retry(url, self.search_stage)
+
+        # Pagination links live outside the result items, so also
+        # collect candidates from the page's internal links
+        next_urls = [p.pop("next_page") for p in products if p.get("next_page")]
+        next_urls.extend(link.get("href")
+                         for link in result.links.get("internal", []))
+
+        # Save links and media information
+        with self.metrics.stages.time("links_media"), \
+                self.tracer.span("save_links_and_media", url=url):
+            await self.save_links_and_media(result, url)
+
+        # Handle downloads
+        if self.config.enable_file_downloads:
+            await self.process_downloads(result)
+
+        self.metrics.total_products += len(products)
+
+        page = {"products": products, "next_urls": next_urls}
+
+        # Cache the results
+        self.cache.set(url, page)
+
+        return page
+
+    async def fetch_with_retry(self, url: str, stage: FetchStage):
+        """Fetch a page of a stage until it succeeds, returning the result and its items
+
+        Raises the last classified error once retries are exhausted.
+        """
+        host = f"host:{urlparse(url).netloc}"
+        self.retry_policy.budget.deposit()
+        delay = None
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.journal and stage is self.search_stage:
+                self.journal.mark(url, IN_FLIGHT)
+            with self.metrics.stages.time("circuit_breaker_wait"):
+                await self.retry_policy.wait_for(host)
+            self.metrics.total_requests += 1
+            error = None
+            try:
+                with self.tracer.span("fetch_page", url=url, attempt=attempt):
+                    result, products, captcha = await self.fetch_page(url, stage)
 
-                # Handle CAPTCHA detection
-                if self.config.enable_captcha_detection and any(p.get("captcha_detected") for p in products):
+                # The blocked context has already been retired
+                if captcha:
                     self.metrics.captchas_encountered += 1
-                    logging.warning(
-                        f"CAPTCHA detected on {url}, changing proxy and retrying...")
-                    self.browser_config.proxy = random.choice(self.proxies)
-                    continue
-
-                # Save links and media information
-                self.save_links_and_media(result, url)
-
-                # Handle downloads
-                if self.config.enable_file_downloads:
-                    await self.process_downloads(result)
-
-                self.metrics.successful_requests += 1
-                self.metrics.total_products += len(products)
-
-                # Cache the results
-                self.cache.set(url, products)
-
-                return products
-
+                    raise CaptchaError(f"CAPTCHA detected on {url}")
+            except asyncio.CancelledError:
+                self.retry_policy.get_breaker(host).release()
+                raise
             except Exception as e:
-                logging.error(
-                    f"Attempt {attempt + 1} failed for {url}: {str(e)}")
+                error = classify(e)
+                if not isinstance(error, CaptchaError):
+                    counter = f"{error.kind}_errors"
+                    setattr(self.metrics, counter, getattr(self.metrics, counter) + 1)
                 self.metrics.failed_requests += 1
-                if attempt < self.config.max_retries - 1:
-                    await asyncio.sleep(self.config.retry_delay)
-                else:
-                    raise
+                logging.error(
+                    f"Attempt {attempt} failed for {url} ({error.kind}): {str(error)}")
+            self.retry_policy.record(host, error)
+
+            if error is not None:
+                if not self.retry_policy.should_retry(error, attempt):
+                    raise error
+                delay = self.retry_policy.get_backoff(delay)
+                with self.metrics.stages.time("retry_backoff", kind=error.kind):
+                    await asyncio.sleep(delay)
+                continue
+
+            self.metrics.successful_requests += 1
+            return result, products
+
+    async def process_detail(self, job: DetailJob) -> Dict:
+        """Fetch and parse the detail page of one product"""
+        cached_data = self.cache.get(job.url)
+        if not cached_data:
+            _, items = await self.fetch_with_retry(job.url, self.detail_stage)
+            if not items:
+                raise ExtractionError(f"No product details on {job.url}")
+            cached_data = {"item": items[0]}
+            self.cache.set(job.url, cached_data)
+        return parse_details(cached_data["item"], job)
 
     async def process_downloads(self, result):
         """Process downloaded files"""
@@ -241,7 +563,7 @@ class AmazonScraper:
             self.metrics.total_bytes_downloaded += file_size
             logging.info(f"Downloaded file: {file}, Size: {file_size} bytes")
 
-    def save_links_and_media(self, result, url):
+    async def save_links_and_media(self, result, url):
         """Save extracted links and media information"""
         links_data = {
             "url": url,
@@ -258,19 +580,34 @@ class AmazonScraper:
             "audio": result.media.get("audio", [])
         }
 
-        self.save_data_compressed(self.links_filename, links_data)
-        self.save_data_compressed(self.media_filename, media_data)
+        await self.pipeline.put([links_data], kind="page_links")
+        await self.pipeline.put([media_data], kind="page_media")
         self.log_extraction_stats(links_data, media_data)
 
-    def save_data_compressed(self, filename: str, data: Dict):
-        """Save data with optional compression"""
-        if self.config.compression_enabled:
-            import gzip
-            with gzip.open(f"{filename}.gz", 'at') as f:
-                f.write(json.dumps(data) + "\n")
-        else:
-            with open(filename, 'a') as f:
-                f.write(json.dumps(data) + "\n")
+        if self.config.enable_db_storage:
+            await self.pipeline.put(self.normalize_links(links_data), kind="links")
+            await self.pipeline.put(self.normalize_media(media_data), kind="media")
+
+    def normalize_links(self, links_data: Dict) -> List[Dict]:
+        """Flatten a page's links into one row per (url, href)"""
+        rows = {}
+        for link_type in ("internal", "external"):
+            for link in links_data[f"{link_type}_links"]:
+                href = link.get("href")
+                if href and href not in rows:
+                    rows[href] = {"url": links_data["url"], "link_type": link_type, **link}
+        return list(rows.values())
+
+    def normalize_media(self, media_data: Dict) -> List[Dict]:
+        """Flatten a page's media into one row per (url, src)"""
+        rows = {}
+        for media_type in ("images", "videos", "audio"):
+            for item in media_data[media_type]:
+                src = item.get("src")
+                if src and src not in rows:
+                    rows[src] = {"url": media_data["url"], **item}
+                    rows[src].setdefault("type", media_type.rstrip("s"))
+        return list(rows.values())
 
     def log_extraction_stats(self, links_data: Dict, media_data: Dict):
         """Log extraction statistics"""
@@ -292,166 +629,304 @@ class AmazonScraper:
 
         print("\n🚀 Starting scraping process...\n")
 
-        extracted_data = []
-        async with AsyncWebCrawler(config=self.browser_config) as crawler:
-            tasks = []
-            for url in self.search_urls:
-                tasks.append(self.process_url_with_retry(url, crawler))
-
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            for result in results:
-                if isinstance(result, Exception):
-                    logging.error(f"Failed to process URL: {str(result)}")
-                else:
-                    extracted_data.extend(result)
+        async for _ in self.crawl():
+            pass
 
-        await self.save_results(extracted_data)
+        logging.info(f"Crawled {self.frontier.total_enqueued} pages across "
+                     f"{self.keywords_fed} keywords")
+        if self.keywords_skipped:
+            logging.info(f"Skipped {self.keywords_skipped} keywords whose recrawl "
+                         f"is not due yet")
+        self.close()
         self.save_metrics()
         self.print_summary()
 
-    async def save_results(self, extracted_data: List[Dict]):
-        """Save results to various outputs"""
+    def close(self):
+        """Close the cache, trace, journal and change tracker after crawling"""
+        self.cache.close()
+        self.tracer.close()
+        if self.journal:
+            self.journal.close()
+        if self.change_tracker:
+            self.change_tracker.update_schedule()
+            self.change_tracker.close()
+
+    async def crawl(self) -> AsyncIterator[Dict]:
+        """Crawl every keyword, yielding each page's products as soon as they are processed
+
+        Keywords are read lazily into a bounded frontier drained by a fixed
+        pool of workers, and finished pages pass through a queue as small as
+        the pool, so memory grows with the concurrency rather than with the
+        number of keywords. A slow consumer holds the workers back. Call
+        ``close`` once done.
+        """
+        frontier = self.frontier = self.create_frontier()
+        self.pipeline = self.create_pipeline()
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.config.max_concurrent_requests)
+        async with contextlib.AsyncExitStack() as stack:
+            if self.config.enable_profiling or self.config.memory_snapshot_interval:
+                stack.enter_context(Profiler(
+                    self.output_folder, cpu=self.config.enable_profiling,
+                    sample_interval=self.config.profile_sample_interval,
+                    memory_interval=self.config.memory_snapshot_interval))
+            if self.config.metrics_port:
+                stack.enter_context(MetricsServer(
+                    self.metrics, self.config.metrics_host, self.config.metrics_port))
+                print(f"📡 Serving metrics on http://{self.config.metrics_host}:"
+                      f"{self.config.metrics_port}/metrics")
+            if self.config.metrics_snapshot_interval:
+                await stack.enter_async_context(SnapshotWriter(
+                    self.snapshots_filename, self.config.metrics_snapshot_interval,
+                    functools.partial(self.get_snapshot, frontier)))
+            if self.detail_stage:
+                # Closed after the pipeline, which records fetched details as it writes
+                self.details = self.create_detail_queue()
+                stack.callback(self.details.close)
+            await stack.enter_async_context(self.pipeline)
+            await stack.enter_async_context(self.browser_pool)
+            if self.http_fetcher:
+                await stack.enter_async_context(self.http_fetcher)
+            if self.image_fetcher:
+                await stack.enter_async_context(self.image_fetcher)
+            # Enough workers for the highest limit; the limiter decides how many fetch
+            workers = [
+                asyncio.create_task(self.crawl_worker(frontier, self.pipeline, results))
+                for _ in range(self.get_worker_count())]
+            if self.detail_stage:
+                workers.extend(
+                    asyncio.create_task(self.detail_worker(self.details, self.pipeline))
+                    for _ in range(self.get_worker_count(self.detail_stage)))
+            feeder = asyncio.create_task(self.feed_frontier(frontier))
+
+            async def finish():
+                try:
+                    await feeder
+                    await frontier.join()
+                    # Search pages queue their details before they are done
+                    if self.details is not None:
+                        await self.details.join()
+                finally:
+                    await results.put(None)
+
+            finisher = asyncio.create_task(finish())
+            try:
+                while True:
+                    page = await results.get()
+                    if page is None:
+                        break
+                    yield page
+                await finisher  # Surfaces errors reading the keywords
+            finally:
+                for task in (*workers, feeder, finisher):
+                    task.cancel()
+                await asyncio.gather(*workers, feeder, finisher, return_exceptions=True)
+
+    def get_worker_count(self, stage: Optional[FetchStage] = None) -> int:
+        stage = stage or self.search_stage
+        if stage.controller:
+            return max(stage.limiter.limit, stage.controller.max_limit)
+        return stage.limiter.limit
+
+    def create_detail_queue(self) -> DetailQueue:
+        return DetailQueue(
+            base_url=self.base_url,
+            state_path=self.config.detail_state_path,
+            priority=self.config.detail_priority,
+            refresh_after=self.config.detail_refresh_after,
+            max_pending=self.config.detail_queue_size,
+            seen_capacity=self.config.seen_set_capacity,
+            seen_error_rate=self.config.seen_set_error_rate,
+            metrics=self.metrics)
+
+    def iter_keywords(self) -> Iterator[str]:
+        """Yield the keywords of this run lazily, from the config or a keywords file"""
+        keywords = (read_keywords(self.config.keywords_file)
+                    if self.config.keywords_file else iter(self.keywords))
+        if self.config.keyword_shard:
+            index, count = self.config.keyword_shard
+            keywords = itertools.islice(keywords, index, None, count)
+        for keyword in keywords:
+            if (self.change_tracker and self.config.adaptive_recrawl
+                    and not self.change_tracker.is_due(keyword)):
+                self.keywords_skipped += 1
+                continue
+            yield keyword
+
+    async def feed_frontier(self, frontier: CrawlFrontier):
+        """Push one search URL per keyword as the frontier makes room for it"""
+        for keyword in self.iter_keywords():
+            await frontier.feed(f"{self.base_url}{keyword.replace(' ', '+')}", keyword)
+            self.keywords_fed += 1
+
+    def create_frontier(self) -> CrawlFrontier:
+        """Create the crawl frontier, restoring unfinished pages when resuming"""
+        frontier = CrawlFrontier(
+            base_url=self.base_url,
+            max_depth=self.config.max_depth,
+            keyword_max_depth=self.config.keyword_max_depth,
+            seen_capacity=self.config.seen_set_capacity,
+            seen_error_rate=self.config.seen_set_error_rate,
+            journal=self.journal,
+            max_pending=self.config.frontier_queue_size
+        )
+        if self.config.resume and self.journal:
+            requeued = frontier.restore()
+            print(f"♻️  Resuming: {self.journal.count(DONE)} pages done, "
+                  f"{requeued} re-queued, {self.journal.count(FAILED)} failed")
+            logging.info(f"Resuming run in {self.output_folder}: re-queued {requeued} URLs")
+        return frontier
+
+    async def crawl_worker(self, frontier: CrawlFrontier, pipeline: ResultPipeline,
+                           results: Optional[asyncio.Queue] = None):
+        """Pull pages from the frontier until cancelled, reporting finished pages to results"""
+        while True:
+            entry: FrontierEntry = await frontier.get()
+            stages = self.metrics.stages
+            try:
+                with stages.time("page", keyword=entry.keyword), \
+                        self.tracer.span("process_url", url=entry.url):
+                    page = await self.process_url(entry.url)
+                if page:
+                    # Queue the next pages before this one can be marked done,
+                    # so a resumed run never loses track of them
+                    if self.config.follow_pagination:
+                        frontier.discover(entry, page["next_urls"])
+                    with stages.time("normalize", keyword=entry.keyword):
+                        products = normalize_products(page["products"])
+                        for product in products:
+                            product["keyword"] = entry.keyword
+                        changes = None
+                        if self.change_tracker:
+                            changes = PendingChanges()
+                            listed = products
+                            products = self.filter_unchanged(frontier, entry, products, changes)
+                    if changes is not None and self.config.enable_db_storage:
+                        # Unchanged products are not written again, but the
+                        # warehouse still has to know they are listed
+                        written = {product.get("asin") for product in products}
+                        await pipeline.put([product for product in listed
+                                            if product.get("asin") not in written], kind="seen")
+                    # The page only counts as done, and its fingerprints are only
+                    # stored, once its products are written
+                    on_failed = functools.partial(
+                        self.journal.mark, entry.url, FAILED) if self.journal else None
+                    await pipeline.put(
+                        products, on_written=functools.partial(
+                            self.on_page_written, entry.url, changes),
+                        on_failed=on_failed)
+                    if self.image_fetcher:
+                        for product in products:
+                            await self.image_fetcher.put(product.get("image"))
+                    if self.details is not None:
+                        await self.details.put_products(products, entry.keyword)
+                    if results is not None:
+                        await results.put({"url": entry.url, "keyword": entry.keyword,
+                                           "depth": entry.depth, "products": products})
+                elif self.journal:
+                    self.journal.mark(entry.url, FAILED)
+            except Exception as e:
+                logging.error(f"Failed to process URL {entry.url}: {str(e)}")
+                if self.journal:
+                    self.journal.mark(entry.url, FAILED)
+            finally:
+                frontier.task_done()
+
+    async def detail_worker(self, details: DetailQueue, pipeline: ResultPipeline):
+        """Fetch queued detail pages until cancelled, highest priority first"""
+        while True:
+            job = await details.get()
+            try:
+                with self.metrics.stages.time("detail_page"), \
+                        self.tracer.span("process_detail", url=job.url):
+                    record = await self.process_detail(job)
+                # Only remembered as fetched once written
+                await pipeline.put([record], kind="details",
+                                   on_written=functools.partial(details.mark_fetched, job))
+                self.metrics.details_fetched += 1
+            except Exception as e:
+                self.metrics.details_failed += 1
+                logging.error(f"Failed to fetch details of {job.asin}: {str(e)}")
+            finally:
+                details.task_done()
+
+    def on_page_written(self, url: str, changes: Optional[PendingChanges]):
+        if changes is not None:
+            self.change_tracker.commit(changes)
+        if self.journal:
+            self.journal.mark(url, DONE)
+
+    def filter_unchanged(self, frontier: CrawlFrontier, entry: FrontierEntry,
+                         products: List[Dict], changes: PendingChanges) -> List[Dict]:
+        """Drop products that have not changed since the previous crawl, staging their state"""
+        if not self.change_tracker.check_page(frontier.get_key(entry.url),
+                                              entry.keyword, products, changes):
+            self.metrics.products_unchanged += len(products)
+            return []
+        return self.change_tracker.filter_changed(products, changes)
+
+    def create_pipeline(self) -> ResultPipeline:
+        """Create the result pipeline with one sink per enabled output"""
+        compressed = self.config.compression_enabled
+        append = self.config.resume
+        sinks = []
         if self.config.enable_json_output:
-            self.save_data_compressed(self.json_filename, extracted_data)
-
+            sinks.append(JsonlSink(self.json_filename, compressed, append=append))
+            if self.detail_stage:
+                sinks.append(JsonlSink(self.details_filename, compressed, append=append,
+                                       kind="details"))
         if self.config.enable_csv_output:
-            df = pd.DataFrame(extracted_data)
-            if self.config.compression_enabled:
-                df.to_csv(f"{self.csv_filename}.gz",
-                          index=False, compression='gzip')
-            else:
-                df.to_csv(self.csv_filename, index=False)
-
-        filtered_data = self.filter_data(
-            extracted_data, min_rating=4.0, exclude_sponsored=True)
-
+            sinks.append(CsvSink(self.csv_filename, compressed, append=append))
         if self.config.enable_markdown_output:
-            self.save_to_markdown(filtered_data)
-
+            sinks.append(MarkdownSink(self.md_filename, functools.partial(
+                filter_products,
+                min_rating=self.config.filter_min_rating,
+                exclude_sponsored=self.config.filter_exclude_sponsored,
+                min_price=self.config.filter_min_price,
+                max_price=self.config.filter_max_price), append=append))
+        if self.config.enable_parquet_output:
+            # A resumed run writes new part files instead of replacing the earlier ones
+            run_id = self.timestamp
+            if self.config.keyword_shard:
+                run_id += f"-shard{self.config.keyword_shard[0]}"  # Shards share the timestamp
+            if append:
+                run_id += datetime.datetime.now().strftime("-resumed-%H-%M-%S")
+            sinks.append(ParquetSink(self.config.parquet_path, run_id,
+                                     self.config.parquet_row_group_size))
         if self.config.enable_db_storage:
-            await self.save_to_db(extracted_data)
-
-    def filter_data(self, data, min_rating=4.0, exclude_sponsored=True):
-        filtered = []
-        for product in data:
-            try:
-                rating = float(product.get("rating", "0").split()[0])
-                if rating >= min_rating and (not exclude_sponsored or not product.get("sponsored")):
-                    filtered.append(product)
-            except ValueError:
-                continue
-        return filtered
-
-    async def save_to_db(self, data: List[Dict]):
-        """Save data to database asynchronously"""
-        def db_operation():
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-
-            # Create tables
-            self.create_tables(cursor)
-
-            # Process data in chunks
-            for i in range(0, len(data), self.config.chunk_size):
-                chunk = data[i:i + self.config.chunk_size]
-                self.insert_chunk(cursor, chunk)
-                conn.commit()
-
-            conn.close()
-
-        with ThreadPoolExecutor() as pool:
-            await asyncio.get_event_loop().run_in_executor(pool, db_operation)
-
-    def save_to_markdown(self, data):
-        with open(self.md_filename, "w", encoding="utf-8") as f:
-            f.write("# Amazon Scraped Products\n\n")
-            for product in data:
-                f.write(f"## {product.get('title', 'N/A')}\n")
-                f.write(f"- **ASIN:** {product.get('asin', 'N/A')}\n")
-                f.write(
-                    f"- **URL:** [Link](https://www.amazon.com{product.get('url', '')})\n")
-                f.write(f"- **Price:** {product.get('price', 'N/A')}\n")
-                f.write(f"- **Rating:** {product.get('rating', 'N/A')}\n")
-                f.write(f"![Product Image]({product.get('image', '')})\n\n")
-
-    def create_tables(self, cursor):
-        """Create database tables"""
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                asin TEXT PRIMARY KEY,
-                title TEXT,
-                url TEXT,
-                image TEXT,
-                rating TEXT,
-                reviews_count TEXT,
-                price TEXT,
-                original_price TEXT,
-                sponsored TEXT,
-                delivery_info TEXT
-            )""")
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS links (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT,
-                href TEXT,
-                text TEXT,
-                title TEXT,
-                base_domain TEXT,
-                link_type TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )""")
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS media (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT,
-                src TEXT,
-                alt TEXT,
-                type TEXT,
-                score INTEGER,
-                width INTEGER,
-                height INTEGER,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )""")
-
-        # Add indexes for better query performance
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_products_asin ON products(asin)")
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_links_url ON links(url)")
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_media_url ON media(url)")
-
-    def insert_chunk(self, cursor, chunk: List[Dict]):
-        """Insert a chunk of data into the database"""
-        for product in chunk:
-            cursor.execute(
-                "INSERT OR IGNORE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    product.get("asin"), product.get(
-                        "title"), product.get("url"),
-                    product.get("image"), product.get(
-                        "rating"), product.get("reviews_count"),
-                    product.get("price"), product.get("original_price"),
-                    str(product.get("sponsored")), str(
-                        product.get("delivery_info"))
-                )
-            )
+            sinks.append(SQLiteSink(self.db_filename, self.config.chunk_size,
+                                    tracer=self.tracer, metrics=self.metrics))
+        archive_options = self.config.get_archive_options()
+        sinks.append(ArchiveSink(self.links_filename, "page_links", **archive_options))
+        sinks.append(ArchiveSink(self.media_filename, "page_media", **archive_options))
+        return ResultPipeline(sinks, max_pending=self.config.sink_queue_size,
+                              stages=self.metrics.stages, tracer=self.tracer)
+
+    def get_snapshot(self, frontier: CrawlFrontier) -> Dict:
+        """Counters and per-stage latency percentiles at this point of the run"""
+        return {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "elapsed_time": round(self.metrics.get_elapsed_time(), 3),
+            **self.metrics.get_counters(),
+            **self.metrics.get_gauges(),
+            "queued_pages": len(frontier),
+            "queued_details": len(self.details) if self.details is not None else 0,
+            "products_written": self.pipeline.total_written,
+            "stages": self.metrics.stages.summary(),
+        }
 
     def save_metrics(self):
         """Save metrics to file"""
         metrics_data = {
-            "total_requests": self.metrics.total_requests,
-            "successful_requests": self.metrics.successful_requests,
-            "failed_requests": self.metrics.failed_requests,
-            "total_products": self.metrics.total_products,
-            "total_downloads": self.metrics.total_downloads,
-            "total_bytes_downloaded": self.metrics.total_bytes_downloaded,
-            "captchas_encountered": self.metrics.captchas_encountered,
+            **self.metrics.get_counters(),
+            **self.metrics.get_gauges(),
+            "contexts_retired": self.browser_pool.contexts_retired,
+            "http_fetches": self.metrics.http_fetches,
+            "browser_fallbacks": self.metrics.browser_fallbacks,
+            "proxy_health": self.browser_pool.get_health_report(),
+            "circuit_breakers": self.retry_policy.get_report(),
             "success_rate": self.metrics.get_success_rate(),
-            "elapsed_time": self.metrics.get_elapsed_time()
+            "elapsed_time": self.metrics.get_elapsed_time(),
+            "stages": self.metrics.stages.summary()
         }
 
         with open(self.metrics_filename, 'w') as f:
@@ -472,7 +947,33 @@ class AmazonScraper:
         print(f"⬇️  Total Downloads: {self.metrics.total_downloads}")
         print(
             f"💾 Total Data Downloaded: {self.metrics.total_bytes_downloaded / 1024:.2f} KB")
+        if self.image_fetcher:
+            print(f"🖼️  Images Downloaded/Not Modified/Deduplicated/Failed: "
+                  f"{self.metrics.images_downloaded}/{self.metrics.images_not_modified}/"
+                  f"{self.metrics.images_deduplicated}/{self.metrics.images_failed} "
+                  f"({self.metrics.image_bytes_downloaded / 1024:.2f} KB)")
         print(f"🚫 CAPTCHAs Encountered: {self.metrics.captchas_encountered}")
+        print(f"🔄 Retries (denied by budget): {self.metrics.retries} "
+              f"({self.metrics.retries_denied})")
+        print(f"⚡ Circuit Breaker Trips: {self.metrics.circuit_breaker_trips}")
+        if self.concurrency_controller:
+            print(f"🎚️  Concurrency/Rate Limits: {self.concurrency_limiter.limit}/"
+                  f"{self.rate_limiter.requests_per_second:.2f} per second "
+                  f"({self.metrics.limit_increases} raises, "
+                  f"{self.metrics.limit_decreases} cuts)")
+        if self.detail_stage:
+            print(f"🔎 Details Fetched/Deduplicated/Failed: {self.metrics.details_fetched}/"
+                  f"{self.metrics.details_deduplicated}/{self.metrics.details_failed} "
+                  f"(limits {self.detail_stage.limiter.limit}/"
+                  f"{self.detail_stage.rate_limiter.requests_per_second:.2f} per second)")
+        print(f"♻️  Browser Contexts Retired: {self.browser_pool.contexts_retired}")
+        if self.config.enable_db_storage:
+            print(f"🗄️  Database Batches Dropped: {self.metrics.db_batches_dropped}")
+        print(f"💾 Cache Hits/Misses/Evictions: {self.metrics.cache_hits}/"
+              f"{self.metrics.cache_misses}/{self.metrics.cache_evictions}")
+        if self.change_tracker:
+            print(f"🔁 Unchanged Pages/Products Skipped: {self.metrics.pages_unchanged}/"
+                  f"{self.metrics.products_unchanged}")
         print(f"📈 Success Rate: {self.metrics.get_success_rate():.2f}%")
         print(f"⏱️  Total Time: {self.metrics.get_elapsed_time():.2f} seconds")
 
@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import copy
+import gzip
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+from src.config import ScraperConfig
+from .models import ScraperMetrics
+from .database import Database
+from .archive import RecordWriter, RecordReader, remove_archive
+from .utils import Dashboard
+
+
+def run_shard(config: ScraperConfig) -> ScraperMetrics:
+    """Run one shard in its own process, event loop and browser pool"""
+    from .scraper import AmazonScraper
+    scraper = AmazonScraper(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(scraper.scrape_amazon())
+    return scraper.metrics
+
+
+class ShardedScraper:
+    """Split keywords across worker processes and merge their outputs into one run folder"""
+
+    def __init__(self, config: ScraperConfig, processes: int = None):
+        self.config = config
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        if not config.keywords_file:
+            self.processes = min(self.processes, max(1, len(config.keywords)))
+        self.output_folder = config.output_folder
+        self.shards_folder = os.path.join(self.output_folder, "shards")
+        self.metrics = ScraperMetrics(start_time=time.time())
+
+    def create_shard_configs(self) -> List[ScraperConfig]:
+        """Give each shard a round-robin slice of the keywords and of the rate budget"""
+        configs = []
+        for index in range(self.processes):
+            config = copy.deepcopy(self.config)
+            config.keyword_shard = (index, self.processes)
+            config.output_folder = os.path.join(self.shards_folder, f"shard_{index}")
+            config.downloads_path = os.path.join(config.output_folder, "downloads")
+            config.requests_per_second = self.config.requests_per_second / self.processes
+            config.adaptive_min_rate = self.config.adaptive_min_rate / self.processes
+            config.adaptive_max_rate = self.config.adaptive_max_rate / self.processes
+            config.detail_requests_per_second = \
+                self.config.detail_requests_per_second / self.processes
+            if self.config.host_requests_per_second:
+                config.host_requests_per_second = \
+                    self.config.host_requests_per_second / self.processes
+            if self.config.metrics_port:
+                config.metrics_port = self.config.metrics_port + index  # One endpoint per shard
+            configs.append(config)
+        return configs
+
+    def run(self):
+        self.config.print_dashboard()
+        source = self.config.keywords_file or f"{len(self.config.keywords)} keywords"
+        print(f"\n🧩 Sharding {source} across {self.processes} processes\n")
+        configs = self.create_shard_configs()
+
+        with ProcessPoolExecutor(max_workers=self.processes,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(run_shard, config): config for config in configs}
+            for future in as_completed(futures):
+                folder = futures[future].output_folder
+                try:
+                    self.metrics.merge(future.result())
+                    print(f"✅ Finished {os.path.basename(folder)}")
+                except Exception as e:
+                    logging.error(f"Shard {folder} failed: {str(e)}")
+                    print(f"❌ {os.path.basename(folder)} failed: {str(e)}")
+
+        self.merge_outputs([config.output_folder for config in configs])
+        self.save_metrics()
+        self.print_summary()
+
+    def merge_outputs(self, shard_folders: List[str]):
+        """Concatenate the shards' files and databases into the run folder"""
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.concat_files(shard_folders, "amazon_products.jsonl")
+        self.concat_files(shard_folders, "amazon_product_details.jsonl")
+        for name in ("extracted_links", "extracted_media"):
+            self.merge_archives(shard_folders, name)
+        self.concat_files(shard_folders, "amazon_products.csv", skip_lines=1)
+        self.concat_files(shard_folders, "amazon_products.md", skip_lines=2)
+        self.merge_databases(shard_folders)
+
+    def concat_files(self, shard_folders: List[str], name: str, skip_lines: int = 0):
+        for suffix, opener in (("", open), (".gz", gzip.open)):
+            sources = [os.path.join(folder, name + suffix) for folder in shard_folders
+                       if os.path.exists(os.path.join(folder, name + suffix))]
+            if not sources:
+                continue
+            with opener(os.path.join(self.output_folder, name + suffix), "wb") as out:
+                for i, source in enumerate(sources):
+                    with opener(source, "rb") as f:
+                        if i > 0:
+                            for _ in range(skip_lines):
+                                f.readline()
+                        shutil.copyfileobj(f, out)
+
+    def merge_archives(self, shard_folders: List[str], name: str):
+        """Stream the records of the shards' archives into one archive, rebuilt from scratch"""
+        base = os.path.join(self.output_folder, name)
+        remove_archive(base)
+        with RecordWriter(base,
+                          **self.config.get_archive_options()) as writer:
+            for folder in shard_folders:
+                for record in RecordReader(os.path.join(folder, name)):
+                    writer.write(record)
+
+    def merge_databases(self, shard_folders: List[str]):
+        sources = [os.path.join(folder, "amazon_products.db") for folder in shard_folders
+                   if os.path.exists(os.path.join(folder, "amazon_products.db"))]
+        if not sources:
+            return
+        database = Database(os.path.join(self.output_folder, "amazon_products.db"))
+        conn = database.connect()
+        database.create_tables(conn)
+        for source in sources:
+            database.merge_from(source, conn)
+        conn.close()
+
+    def save_metrics(self):
+        metrics_data = {
+            **self.metrics.get_counters(),
+            **self.metrics.get_gauges(),
+            "processes": self.processes,
+            "success_rate": self.metrics.get_success_rate(),
+            "elapsed_time": self.metrics.get_elapsed_time(),
+            "stages": self.metrics.stages.summary()
+        }
+        with open(os.path.join(self.output_folder, "metrics.json"), "w") as f:
+            json.dump(metrics_data, f, indent=4)
+
+    def print_summary(self):
+        Dashboard.print_header("SCRAPING SUMMARY")
+        print(f"🧩 Processes: {self.processes}")
+        print(f"📡 Total Requests: {self.metrics.total_requests}")
+        print(f"✅ Successful Requests: {self.metrics.successful_requests}")
+        print(f"❌ Failed Requests: {self.metrics.failed_requests}")
+        print(f"📦 Total Products: {self.metrics.total_products}")
+        print(f"🚫 CAPTCHAs Encountered: {self.metrics.captchas_encountered}")
+        print(f"🔄 Retries (denied by budget): {self.metrics.retries} "
+              f"({self.metrics.retries_denied})")
+        if self.config.enable_detail_pages:
+            print(f"🔎 Details Fetched/Deduplicated/Failed: {self.metrics.details_fetched}/"
+                  f"{self.metrics.details_deduplicated}/{self.metrics.details_failed}")
+        if self.config.enable_db_storage:
+            print(f"🗄️  Database Batches Dropped: {self.metrics.db_batches_dropped}")
+        print(f"📈 Success Rate: {self.metrics.get_success_rate():.2f}%")
+        print(f"⏱️  Total Time: {self.metrics.get_elapsed_time():.2f} seconds")
+        print(f"\n📂 Data saved in: {self.output_folder}")
+        Dashboard.print_separator()
@@ -0,0 +1,401 @@
+import asyncio
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Set
+from .database import Database, PRODUCT_COLUMNS
+from .models import ScraperMetrics
+from .telemetry import StageMetrics
+from .profiling import Tracer
+from .archive import RecordWriter
+
+
+def open_output(filename: str, compressed: bool, append: bool = False):
+    """Open a text output file, gzip-compressed if requested"""
+    if compressed:
+        return gzip.open(f"{filename}.gz", "at" if append else "wt",
+                         encoding="utf-8", newline="")
+    return open(filename, "a" if append else "w", encoding="utf-8", newline="")
+
+
+def has_output(filename: str, compressed: bool) -> bool:
+    """Whether an output file already exists with some content"""
+    path = f"{filename}.gz" if compressed else filename
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+class ResultSink:
+    """Base class for outputs that receive records batch by batch
+
+    ``write`` may return a Future when the records are only durable once it
+    completes, e.g. after a background commit.
+    """
+    kinds = ("products",)
+
+    def open(self):
+        pass
+
+    def write(self, products: List[Dict], kind: str = "products"):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonlSink(ResultSink):
+    """Write one JSON object per record of one kind (products by default)"""
+
+    def __init__(self, filename: str, compressed: bool = False, append: bool = False,
+                 kind: str = "products"):
+        self.filename = filename
+        self.compressed = compressed
+        self.append = append
+        self.kinds = (kind,)
+
+    def open(self):
+        self.file = open_output(self.filename, self.compressed, self.append)
+
+    def write(self, products: List[Dict], kind: str = "products"):
+        self.file.writelines(json.dumps(product) + "\n" for product in products)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink(ResultSink):
+    """Write products as CSV rows with a fixed header"""
+
+    def __init__(self, filename: str, compressed: bool = False,
+                 fields: List[str] = PRODUCT_COLUMNS, append: bool = False):
+        self.filename = filename
+        self.compressed = compressed
+        self.fields = fields
+        self.append = append
+
+    def open(self):
+        write_header = not (self.append and has_output(self.filename, self.compressed))
+        self.file = open_output(self.filename, self.compressed, self.append)
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields,
+                                     extrasaction="ignore")
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, products: List[Dict], kind: str = "products"):
+        self.writer.writerows(products)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class MarkdownSink(ResultSink):
+    """Append products to a Markdown report, optionally filtered"""
+
+    def __init__(self, filename: str,
+                 product_filter: Optional[Callable[[List[Dict]], List[Dict]]] = None,
+                 append: bool = False):
+        self.filename = filename
+        self.product_filter = product_filter
+        self.append = append
+
+    def open(self):
+        write_header = not (self.append and has_output(self.filename, False))
+        self.file = open(self.filename, "a" if self.append else "w", encoding="utf-8")
+        if write_header:
+            self.file.write("# Amazon Scraped Products\n\n")
+
+    def write(self, products: List[Dict], kind: str = "products"):
+        if self.product_filter:
+            products = self.product_filter(products)
+        for product in products:
+            self.file.write(f"## {product.get('title', 'N/A')}\n")
+            self.file.write(f"- **ASIN:** {product.get('asin', 'N/A')}\n")
+            self.file.write(
+                f"- **URL:** [Link](https://www.amazon.com{product.get('url', '')})\n")
+            self.file.write(f"- **Price:** {product.get('price', 'N/A')}\n")
+            self.file.write(f"- **Rating:** {product.get('rating', 'N/A')}\n")
+            self.file.write(f"![Product Image]({product.get('image', '')})\n\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink(ResultSink):
+    """Write products, details, links, media and seen ASINs into the run database"""
+    kinds = ("products", "links", "media", "details", "seen")
+
+    def __init__(self, db_path: str, batch_size: int = 1000, tracer: Optional[Tracer] = None,
+                 metrics: Optional[ScraperMetrics] = None):
+        self.database = Database(db_path, batch_size=batch_size, tracer=tracer, metrics=metrics)
+
+    def open(self):
+        self.database.start()
+
+    def write(self, rows: List[Dict], kind: str = "products") -> Future:
+        return self.database.write(kind, rows)
+
+    def close(self):
+        self.database.close()
+
+
+class ParquetSink(ResultSink):
+    """Append products as Parquet files, partitioned by keyword and scrape date
+
+    Files are laid out Hive-style under a dataset root shared by all runs
+    (``keyword=<k>/date=<d>/part-<run>.parquet``), so they can be scanned
+    together with ``pyarrow.dataset`` or pandas. Rows are buffered per
+    partition and each flush writes them as one complete part file
+    (``part-<run>.parquet``, then ``part-<run>-2.parquet``, ...). A Parquet
+    file is only readable once closed, so ``write`` returns a Future that
+    completes when every row of the batch is in a closed file.
+    """
+    DICTIONARY_COLUMNS = ["rating", "reviews_count", "price", "original_price",
+                          "delivery_info"]
+
+    def __init__(self, root: str, run_id: str, row_group_size: int = 10000):
+        self.root = root
+        self.run_id = run_id
+        self.row_group_size = row_group_size
+        self.buffers: Dict[str, List[Dict]] = {}
+        self.unflushed: Dict[Future, Set[str]] = {}  # Partitions each batch still waits for
+        self.parts: Dict[str, int] = {}  # Part files written per partition
+        self.buffered_rows = 0
+
+    def open(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema([
+            ("asin", pa.string()),
+            ("title", pa.string()),
+            ("url", pa.string()),
+            ("image", pa.string()),
+            ("rating", pa.string()),
+            ("reviews_count", pa.string()),
+            ("price", pa.string()),
+            ("original_price", pa.string()),
+            ("sponsored", pa.bool_()),
+            ("delivery_info", pa.string()),
+            ("price_value", pa.float64()),
+            ("original_price_value", pa.float64()),
+            ("discount_percent", pa.float64()),
+            ("rating_value", pa.float64()),
+            ("reviews_count_value", pa.int64()),
+            ("scraped_at", pa.timestamp("s")),
+        ])
+
+    def get_partition(self, product: Dict, scraped_at: datetime.datetime) -> str:
+        keyword = re.sub(r"[^\w.-]+", "_", str(product.get("keyword", "unknown"))).strip("_")
+        return os.path.join(f"keyword={keyword or 'unknown'}",
+                            f"date={scraped_at.date().isoformat()}")
+
+    def to_row(self, product: Dict, scraped_at: datetime.datetime) -> Dict:
+        row = {field.name: product.get(field.name) for field in self.schema}
+        if isinstance(row["delivery_info"], list):
+            row["delivery_info"] = "; ".join(map(str, row["delivery_info"]))
+        row["sponsored"] = bool(row["sponsored"])
+        row["scraped_at"] = scraped_at
+        return row
+
+    def write(self, products: List[Dict], kind: str = "products") -> Future:
+        written = Future()
+        partitions = set()
+        scraped_at = datetime.datetime.now().replace(microsecond=0)
+        for product in products:
+            partition = self.get_partition(product, scraped_at)
+            partitions.add(partition)
+            self.buffers.setdefault(partition, []).append(self.to_row(product, scraped_at))
+        self.buffered_rows += len(products)
+        if partitions:
+            self.unflushed[written] = partitions
+        else:
+            written.set_result(None)
+        for partition, rows in list(self.buffers.items()):
+            if len(rows) >= self.row_group_size or self.buffered_rows >= 2 * self.row_group_size:
+                self.flush(partition)
+        return written
+
+    def flush(self, partition: str):
+        rows = self.buffers.pop(partition, [])
+        if not rows:
+            return
+        self.buffered_rows -= len(rows)
+        try:
+            self.pq.write_table(self.pa.Table.from_pylist(rows, schema=self.schema),
+                                self.get_part_path(partition),
+                                use_dictionary=self.DICTIONARY_COLUMNS, compression="zstd")
+        except Exception as e:
+            self.settle(partition, e)
+            raise
+        self.settle(partition)
+
+    def settle(self, partition: str, error: Optional[Exception] = None):
+        """Complete the batches whose last buffered rows were in this partition"""
+        for written, partitions in list(self.unflushed.items()):
+            if partition not in partitions:
+                continue
+            partitions.discard(partition)
+            if error is not None:
+                del self.unflushed[written]
+                written.set_exception(error)
+            elif not partitions:
+                del self.unflushed[written]
+                written.set_result(None)
+
+    def get_part_path(self, partition: str) -> str:
+        part = self.parts[partition] = self.parts.get(partition, 0) + 1
+        suffix = f"-{part}" if part > 1 else ""
+        directory = os.path.join(self.root, partition)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"part-{self.run_id}{suffix}.parquet")
+
+    def close(self):
+        for partition in list(self.buffers):
+            try:
+                self.flush(partition)
+            except Exception as e:
+                logging.error(f"Failed to write Parquet partition {partition}: {str(e)}")
+
+
+class ArchiveSink(ResultSink):
+    """Append whole records of one kind, such as a page's links, to a segmented archive"""
+
+    def __init__(self, base: str, kind: str, **options):
+        self.base = base
+        self.kinds = (kind,)
+        self.options = options
+
+    def open(self):
+        self.writer = RecordWriter(self.base, **self.options)
+
+    def write(self, records: List[Dict], kind: str = "products"):
+        for record in records:
+            self.writer.write(record)
+
+    def close(self):
+        self.writer.close()
+
+
+class ResultPipeline:
+    """Bounded queue that streams record batches to every interested sink as they arrive"""
+
+    def __init__(self, sinks: List[ResultSink], max_pending: int = 100,
+                 stages: Optional[StageMetrics] = None, tracer: Optional[Tracer] = None):
+        self.sinks = sinks
+        self.stages = stages
+        self.tracer = tracer or Tracer()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.task: Optional[asyncio.Task] = None
+        self.confirmations: Set[asyncio.Task] = set()
+        self.total_written = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for sink in self.sinks:
+            await loop.run_in_executor(None, sink.open)
+        self.task = asyncio.create_task(self.consume())
+
+    async def put(self, rows: List[Dict], kind: str = "products",
+                  on_written: Optional[Callable[[], None]] = None,
+                  on_failed: Optional[Callable[[], None]] = None):
+        """Queue a batch, waiting while the writers are behind
+
+        ``on_written`` is called once every sink has written the batch
+        (for the database, once it is committed); ``on_failed`` instead if
+        any sink failed to.
+        """
+        if rows or on_written or on_failed:
+            started = time.perf_counter()
+            await self.queue.put((kind, rows, on_written, on_failed))
+            if self.stages:
+                self.stages.observe("sink_queue_wait", time.perf_counter() - started)
+
+    def write(self, sink: ResultSink, rows: List[Dict], kind: str):
+        """Write one batch to one sink, timing it when stage metrics are enabled"""
+        with self.tracer.span("save_results", sink=type(sink).__name__, kind=kind,
+                              rows=len(rows)):
+            if not self.stages:
+                return sink.write(rows, kind)
+            with self.stages.time("write", sink=type(sink).__name__, kind=kind):
+                return sink.write(rows, kind)
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                break
+            kind, rows, on_written, on_failed = item
+            sinks = [sink for sink in self.sinks if kind in sink.kinds and rows]
+            results = await asyncio.gather(
+                *(loop.run_in_executor(None, self.write, sink, rows, kind) for sink in sinks),
+                return_exceptions=True)
+            failed = False
+            pending = []
+            for sink, result in zip(sinks, results):
+                if isinstance(result, Exception):
+                    failed = True
+                    logging.error(f"{type(sink).__name__} failed to write {kind}: {str(result)}")
+                elif isinstance(result, Future):
+                    pending.append(result)
+            if pending and not failed:
+                # Confirm after the commits without holding up later batches
+                task = asyncio.create_task(
+                    self.confirm(pending, kind, len(rows), on_written, on_failed))
+                self.confirmations.add(task)
+                task.add_done_callback(self.confirmations.discard)
+            elif failed:
+                self.notify(on_failed)
+            else:
+                self.settled(kind, len(rows), on_written)
+
+    async def confirm(self, pending: List[Future], kind: str, count: int,
+                      on_written: Optional[Callable[[], None]],
+                      on_failed: Optional[Callable[[], None]]):
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in pending),
+                                       return_exceptions=True)
+        if any(isinstance(result, Exception) for result in results):
+            logging.error(f"Failed to commit a batch of {kind}")
+            self.notify(on_failed)
+        else:
+            self.settled(kind, count, on_written)
+
+    def settled(self, kind: str, count: int, on_written: Optional[Callable[[], None]]):
+        """Count a batch every sink has durably written and run its callback"""
+        if kind == "products":
+            self.total_written += count
+        self.notify(on_written)
+
+    @staticmethod
+    def notify(callback: Optional[Callable[[], None]]):
+        """Run a batch callback; its errors are logged so the writers keep going"""
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logging.error(f"Result callback failed: {str(e)}")
+
+    async def close(self):
+        await self.queue.put(None)
+        await self.task
+        loop = asyncio.get_running_loop()
+        for sink in self.sinks:
+            await loop.run_in_executor(None, sink.close)
+        # Closing the database commits what is left, settling every confirmation
+        await asyncio.gather(*self.confirmations)
@@ -0,0 +1,242 @@
+import asyncio
+import bisect
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+# Log-spaced upper bounds from 50 µs to about 2.5 minutes, 25% apart
+BUCKETS = tuple(round(0.00005 * 1.25 ** i, 7) for i in range(67))
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are interpolated within a bucket"""
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else lower
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return BUCKETS[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {"count": self.count, "mean": round(self.mean(), 6),
+                "p50": round(self.quantile(0.5), 6), "p95": round(self.quantile(0.95), 6),
+                "p99": round(self.quantile(0.99), 6)}
+
+
+class StageMetrics:
+    """Latency histograms per pipeline stage and label set
+
+    Observations may come from the event loop and from executor threads
+    (the output writers), so updates take a lock. ``label_limits`` bounds
+    the distinct values of unbounded labels such as the keyword: the first
+    values seen keep their own series, later ones are grouped as "other".
+    """
+
+    def __init__(self, label_limits: Optional[Dict[str, int]] = None):
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self.label_limits = label_limits or {}
+        self.label_values: Dict[str, set] = {name: set() for name in self.label_limits}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"histograms": self.histograms, "label_limits": self.label_limits,
+                "label_values": self.label_values}
+
+    def __setstate__(self, state):
+        self.histograms = state["histograms"]
+        self.label_limits = state.get("label_limits", {})
+        self.label_values = state.get("label_values", {})
+        self.lock = threading.Lock()
+
+    def _bound(self, name: str, value: str) -> str:
+        seen = self.label_values[name]
+        if value in seen:
+            return value
+        if len(seen) < self.label_limits[name]:
+            seen.add(value)
+            return value
+        return "other"
+
+    def observe(self, stage: str, seconds: float, **labels):
+        with self.lock:
+            for name in self.label_limits.keys() & labels.keys():
+                labels[name] = self._bound(name, str(labels[name]))
+            key = (stage, tuple(sorted((k, str(v)) for k, v in labels.items())))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+
+    def get(self, stage: str) -> Histogram:
+        """One stage's histogram, merged across all label sets"""
+        merged = Histogram()
+        with self.lock:
+            for (name, _), histogram in self.histograms.items():
+                if name == stage:
+                    merged.merge(histogram)
+        return merged
+
+    def merge(self, other: "StageMetrics"):
+        with self.lock:
+            for key, histogram in other.histograms.items():
+                self.histograms.setdefault(key, Histogram()).merge(histogram)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            stages = sorted({stage for stage, _ in self.histograms})
+        return {stage: self.get(stage).summary() for stage in stages}
+
+    def series(self):
+        with self.lock:
+            return [(stage, dict(labels), histogram.summary())
+                    for (stage, labels), histogram in sorted(self.histograms.items())]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_prometheus(metrics) -> str:
+    """Render a ScraperMetrics as Prometheus text exposition format"""
+    lines = []
+    for name, value in metrics.get_counters().items():
+        lines.append(f"# TYPE scraper_{name}_total counter")
+        lines.append(f"scraper_{name}_total {value}")
+    for name, value in metrics.get_gauges().items():
+        lines.append(f"# TYPE scraper_{name} gauge")
+        lines.append(f"scraper_{name} {value}")
+    lines.append("# TYPE scraper_elapsed_seconds gauge")
+    lines.append(f"scraper_elapsed_seconds {metrics.get_elapsed_time():.3f}")
+
+    lines.append("# TYPE scraper_stage_duration_seconds histogram")
+    with metrics.stages.lock:
+        snapshot = [(stage, dict(labels), list(h.counts), h.count, h.sum)
+                    for (stage, labels), h in sorted(metrics.stages.histograms.items())]
+    for stage, labels, counts, count, total in snapshot:
+        labels = {"stage": stage, **labels}
+        cumulative = 0
+        # Every third bound keeps the output compact; cumulative counts stay exact
+        for i, bound in enumerate(BUCKETS):
+            cumulative += counts[i]
+            if i % 3 == 2:
+                lines.append(f"scraper_stage_duration_seconds_bucket"
+                             f"{_format_labels({**labels, 'le': repr(bound)})} {cumulative}")
+        lines.append(f"scraper_stage_duration_seconds_bucket"
+                     f"{_format_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"scraper_stage_duration_seconds_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"scraper_stage_duration_seconds_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serve live metrics at /metrics in Prometheus text format"""
+
+    def __init__(self, metrics, host: str = "127.0.0.1", port: int = 9108):
+        self.metrics = metrics
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = render_prometheus(server.metrics).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class SnapshotWriter:
+    """Append a metrics snapshot to a JSON Lines file every ``interval`` seconds"""
+
+    def __init__(self, path: str, interval: float, collect: Callable[[], Dict]):
+        self.path = path
+        self.interval = interval
+        self.collect = collect
+        self.task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.write()  # Final snapshot
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
+
+    def write(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.collect()) + "\n")
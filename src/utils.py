@@ -1,21 +1,151 @@
 import asyncio
+import re
 import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote, unquote
+
+# Query parameters that only track how a page was reached
+TRACKING_PARAMS = frozenset({
+    "ref", "ref_", "qid", "sr", "crid", "sprefix", "dib", "dib_tag", "_encoding",
+    "tag", "linkcode", "linkid", "creative", "creativeasin", "camp", "ascsubtag",
+    "content-id", "spla", "psc_ref", "fbclid", "gclid"})
+TRACKING_PREFIXES = ("utm_", "pd_rd_", "pf_rd_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+_REF_SEGMENT = re.compile(r"/ref=[^/]*$")
+
+
+def canonicalize_url(url: str) -> str:
+    """Canonical form of a URL, shared by all URLs that fetch the same page
+
+    Lowercases the scheme and host, drops default ports, fragments, tracking
+    parameters and Amazon's trailing ``/ref=...`` path segment, normalizes
+    percent-encoding and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if parts.hostname:
+        netloc = parts.hostname
+        if parts.port and DEFAULT_PORTS.get(scheme) != parts.port:
+            netloc += f":{parts.port}"
+    path = quote(unquote(_REF_SEGMENT.sub("", parts.path)), safe="/:@!$&'()*+,;=-._~")
+    if netloc and not path:
+        path = "/"
+    query = sorted(((key, value) for key, value in
+                    parse_qsl(parts.query, keep_blank_values=True)
+                    if key.lower() not in TRACKING_PARAMS
+                    and not key.lower().startswith(TRACKING_PREFIXES)),
+                   key=lambda item: item[0])
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+class TokenBucket:
+    """Token bucket that is safe to share between concurrent tasks"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        # Reserve a token under the lock (the balance may go negative) and
+        # sleep outside it, so waiters are served in order without bursting
+        async with self.lock:
+            self._refill()
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
 
 
 class RateLimiter:
-    """Rate limiter for controlling request frequency"""
+    """Rate limiter with one token bucket per proxy and an optional per-host cap
+
+    With ``host_limiter`` set, the per-host cap is that limiter's, so
+    several limiters with their own proxy rates share one cap per host.
+    """
+
+    def __init__(self, requests_per_second: float = 2, burst: int = 1,
+                 host_requests_per_second: Optional[float] = None,
+                 host_limiter: Optional["RateLimiter"] = None):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.host_requests_per_second = host_requests_per_second
+        self.host_limiter = host_limiter
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.delayed = 0  # Requests that had to wait for a proxy's bucket
+
+    def _get_bucket(self, key: str, rate: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, self.burst)
+        return bucket
+
+    async def wait(self, host: Optional[str] = None, proxy: Optional[str] = None):
+        if await self._get_bucket(f"proxy:{proxy}", self.requests_per_second).acquire():
+            self.delayed += 1
+        if host:
+            await (self.host_limiter or self).wait_host(host)
 
-    def __init__(self, requests_per_second: int = 2):
+    async def wait_host(self, host: str):
+        if self.host_requests_per_second:
+            await self._get_bucket(f"host:{host}", self.host_requests_per_second).acquire()
+
+    def set_rate(self, requests_per_second: float):
+        """Change the per-proxy rate, including the buckets already in use"""
         self.requests_per_second = requests_per_second
-        self.minimum_interval = 1.0 / requests_per_second
-        self.last_request_time = 0
-
-    async def wait(self):
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        if elapsed < self.minimum_interval:
-            await asyncio.sleep(self.minimum_interval - elapsed)
-        self.last_request_time = time.time()
+        for key, bucket in self.buckets.items():
+            if key.startswith("proxy:"):
+                bucket._refill()
+                bucket.rate = requests_per_second
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one
+
+    The first caller runs the call; callers arriving while it is in flight
+    await its result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Future] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.calls
+
+    async def run(self, key: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        while key in self.calls:
+            future = self.calls[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This caller was cancelled, not the call it waited on
+
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        try:
+            result = await make_call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved by the caller even if nobody else waits
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.calls[key]
 
 
 class Dashboard:
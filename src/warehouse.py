@@ -0,0 +1,323 @@
+import datetime
+import glob
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+from .database import (Database, PRODUCT_COLUMNS, NUMERIC_COLUMNS, fill_numeric_columns,
+                       get_columns, get_rowid_filter)
+from .changes import FINGERPRINT_FIELDS, get_fingerprint
+
+RUN_PREFIX = "amazon_scrape_"
+RUN_TIME_FORMAT = "%Y-%m-%d_%H-%M"
+# Run database tables merged, each tracked by the highest rowid merged so far
+MERGED_TABLES = ["products", "products_seen", "links", "media", "product_details"]
+VERSION_COLUMNS = ["asin", "scraped_at", "run_id", "partition", "fingerprint"] + \
+    PRODUCT_COLUMNS[1:]
+
+
+def get_scrape_time(run_folder: str) -> float:
+    """Start time of a run, from its folder name or else its database's modification time"""
+    name = os.path.basename(run_folder.rstrip("/\\"))
+    try:
+        return datetime.datetime.strptime(name[len(RUN_PREFIX):], RUN_TIME_FORMAT).timestamp()
+    except ValueError:
+        return os.path.getmtime(os.path.join(run_folder, "amazon_products.db"))
+
+
+def get_partition(timestamp: float) -> str:
+    """Monthly partition of a scrape time, e.g. 2025-01"""
+    return time.strftime("%Y-%m", time.gmtime(timestamp))
+
+
+class Warehouse:
+    """One SQLite database consolidating the products, links and media of every run
+
+    ``products`` holds the latest state of each ASIN with its first and last
+    scrape time, and has the same columns and indexes as a run database, so
+    it can be served by ProductQuery. ``product_versions`` keeps a row per
+    ASIN and scrape time only when the product's content fingerprint
+    changed, partitioned by month. Merging a run only looks up its own
+    ASINs by key, so it costs the same however much history is stored.
+    ``merged_rows`` keeps the highest rowid merged from each table of each
+    run, so a run resumed after it was merged only has its new rows merged.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.database = Database(path)
+        self.conn = self.database.connect()
+        self.conn.create_function("fingerprint", len(FINGERPRINT_FIELDS),
+                                  lambda *values: get_fingerprint(
+                                      dict(zip(FINGERPRINT_FIELDS, values))),
+                                  deterministic=True)
+        self.create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def create_tables(self):
+        # Only takes effect on a new file; lets maintenance return freed pages
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        with self.conn:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS products (
+                    asin TEXT PRIMARY KEY,
+                    {', '.join(f'{column} {self.get_type(column)}'
+                               for column in PRODUCT_COLUMNS[1:])},
+                    fingerprint TEXT,
+                    first_seen REAL,
+                    last_seen REAL
+                )""")
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS product_versions (
+                    asin TEXT,
+                    scraped_at REAL,
+                    run_id TEXT,
+                    partition TEXT,
+                    fingerprint TEXT,
+                    {', '.join(f'{column} {self.get_type(column)}'
+                               for column in PRODUCT_COLUMNS[1:])},
+                    PRIMARY KEY (asin, scraped_at)
+                ) WITHOUT ROWID""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    path TEXT,
+                    scraped_at REAL,
+                    merged_at REAL,
+                    products INTEGER,
+                    changed INTEGER
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS merged_rows (
+                    run_id TEXT,
+                    source TEXT,
+                    last_rowid INTEGER,
+                    PRIMARY KEY (run_id, source)
+                ) WITHOUT ROWID""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS partitions (
+                    partition TEXT PRIMARY KEY,
+                    compacted_at REAL
+                )""")
+        self.database.create_tables(self.conn)
+        with self.conn:
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_versions_partition "
+                "ON product_versions(partition)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_last_seen ON products(last_seen)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_links_timestamp ON links(timestamp)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_timestamp ON media(timestamp)")
+
+    @staticmethod
+    def get_type(column: str) -> str:
+        if column == "reviews_count_value":
+            return "INTEGER"
+        return "REAL" if column.endswith(("_value", "_percent")) else "TEXT"
+
+    def get_merged_rows(self, run_id: str) -> Dict[str, int]:
+        return dict(self.conn.execute(
+            "SELECT source, last_rowid FROM merged_rows WHERE run_id = ?", (run_id,)))
+
+    def get_new_rows(self, run_id: str) -> Dict[str, Tuple[int, int]]:
+        """Rowid range of each attached run table not merged yet, empty when there is none"""
+        merged = self.get_merged_rows(run_id)
+        ranges = {}
+        for table in MERGED_TABLES:
+            if not get_columns(self.conn, table, "source"):
+                continue  # Written before the table existed
+            until = self.conn.execute(
+                f"SELECT ifnull(max(rowid), 0) FROM source.{table}").fetchone()[0]
+            if until > merged.get(table, 0):
+                ranges[table] = (merged.get(table, 0), until)
+        return ranges
+
+    def merge_run(self, run_folder: str) -> Optional[Dict]:
+        """Merge the rows a run folder added since it was last merged
+
+        Returns the counts of the merged products, or None if there was
+        nothing new.
+        """
+        source = os.path.join(run_folder, "amazon_products.db")
+        run_id = os.path.basename(run_folder.rstrip("/\\"))
+        scraped_at = get_scrape_time(run_folder)
+        params = {"scraped_at": scraped_at, "run_id": run_id,
+                  "partition": get_partition(scraped_at)}
+        columns = ", ".join(PRODUCT_COLUMNS)
+
+        self.conn.execute("ATTACH DATABASE ? AS source", (source,))
+        try:
+            # Bounded up front, so rows the run writes meanwhile wait for the next merge
+            ranges = self.get_new_rows(run_id)
+            if not ranges:
+                return None
+            with self.conn:
+                # Runs written by older versions lack some columns; the numeric
+                # ones are parsed from the stored strings
+                present = get_columns(self.conn, "products", "source")
+                missing = [column for column in PRODUCT_COLUMNS if column not in present]
+                self.conn.execute("DROP TABLE IF EXISTS temp.incoming")
+                self.conn.execute(
+                    "CREATE TEMP TABLE incoming AS SELECT "
+                    + ", ".join(f"NULL AS {c}" if c in missing else c for c in PRODUCT_COLUMNS)
+                    + f", fingerprint({', '.join(FINGERPRINT_FIELDS)}) AS fingerprint "
+                    f"FROM source.products WHERE {get_rowid_filter(ranges.get('products'))}")
+                if any(column in NUMERIC_COLUMNS for column in missing):
+                    fill_numeric_columns(self.conn, "temp.incoming")
+                products = self.conn.execute("SELECT count(*) FROM incoming").fetchone()[0]
+
+                # A new version only where the content differs from the one in
+                # effect at this scrape time (runs may be merged out of order)
+                changed = self.conn.execute(
+                    f"INSERT OR IGNORE INTO product_versions ({', '.join(VERSION_COLUMNS)}) "
+                    f"SELECT i.asin, :scraped_at, :run_id, :partition, i.fingerprint, "
+                    f"{', '.join(f'i.{c}' for c in PRODUCT_COLUMNS[1:])} FROM incoming i "
+                    f"WHERE i.fingerprint IS NOT (SELECT v.fingerprint FROM product_versions v "
+                    f"WHERE v.asin = i.asin AND v.scraped_at <= :scraped_at "
+                    f"ORDER BY v.scraped_at DESC LIMIT 1)", params).rowcount
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO partitions (partition) VALUES (:partition)", params)
+
+                self.conn.execute(
+                    f"INSERT INTO products ({columns}, fingerprint, first_seen, last_seen) "
+                    f"SELECT {columns}, fingerprint, :scraped_at, :scraped_at FROM incoming "
+                    f"WHERE true ON CONFLICT(asin) DO UPDATE SET "
+                    + ", ".join(f"{c} = excluded.{c}"
+                                for c in PRODUCT_COLUMNS[1:] + ["fingerprint", "last_seen"])
+                    + " WHERE excluded.last_seen >= products.last_seen", params)
+                self.conn.execute(
+                    "UPDATE products SET first_seen = :scraped_at WHERE first_seen > :scraped_at "
+                    "AND asin IN (SELECT asin FROM incoming)", params)
+                if "products_seen" in ranges:
+                    # Listed but unchanged, so left out of the run's products
+                    self.conn.execute(
+                        "UPDATE products SET last_seen = :scraped_at "
+                        "WHERE last_seen < :scraped_at AND asin IN (SELECT asin FROM "
+                        f"source.products_seen WHERE {get_rowid_filter(ranges['products_seen'])})",
+                        params)
+                self.database.merge_records(self.conn, ranges={
+                    table: ranges.get(table, (0, 0)) for table in MERGED_TABLES})
+                self.conn.execute(
+                    "INSERT INTO runs VALUES (:run_id, :path, :scraped_at, :merged_at, "
+                    ":products, :changed) ON CONFLICT(run_id) DO UPDATE SET "
+                    "merged_at = excluded.merged_at, products = products + excluded.products, "
+                    "changed = changed + excluded.changed",
+                    {**params, "path": os.path.abspath(run_folder), "merged_at": time.time(),
+                     "products": products, "changed": changed})
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO merged_rows VALUES (?, ?, ?)",
+                    [(run_id, table, until) for table, (_, until) in ranges.items()])
+                self.conn.execute("DROP TABLE incoming")
+        finally:
+            self.conn.execute("DETACH DATABASE source")
+        return {"run_id": run_id, "products": products, "changed": changed}
+
+    def merge_results(self, results_folder: str) -> List[Dict]:
+        """Merge the new rows of every run under a results folder, oldest first"""
+        folders = [os.path.dirname(path) for path in
+                   glob.glob(os.path.join(glob.escape(results_folder), f"{RUN_PREFIX}*",
+                                          "amazon_products.db"))]
+        reports = []
+        for folder in sorted(folders, key=get_scrape_time):
+            try:
+                report = self.merge_run(folder)
+            except sqlite3.DatabaseError as e:
+                logging.error(f"Failed to merge {folder}: {str(e)}")
+                continue
+            if report:
+                logging.info(f"Merged {folder}: {report['products']} products, "
+                             f"{report['changed']} new or changed")
+                reports.append(report)
+        return reports
+
+    def compact(self, older_than_days: float) -> int:
+        """Keep only the last version of each product in partitions older than the given age
+
+        Each partition is compacted once, so the cost follows the
+        partitions that newly crossed the age, not the whole history.
+        """
+        cutoff = get_partition(time.time() - older_than_days * 86400)
+        partitions = [row[0] for row in self.conn.execute(
+            "SELECT partition FROM partitions WHERE compacted_at IS NULL AND partition < ? "
+            "ORDER BY partition", (cutoff,))]
+        removed = 0
+        for partition in partitions:
+            with self.conn:
+                removed += self.conn.execute(
+                    "DELETE FROM product_versions WHERE partition = :partition "
+                    "AND EXISTS (SELECT 1 FROM product_versions n WHERE n.asin = "
+                    "product_versions.asin AND n.partition = :partition "
+                    "AND n.scraped_at > product_versions.scraped_at)",
+                    {"partition": partition}).rowcount
+                self.conn.execute("UPDATE partitions SET compacted_at = ? WHERE partition = ?",
+                                  (time.time(), partition))
+        return removed
+
+    def apply_retention(self, retention_days: float) -> int:
+        """Drop history, links and media older than the retention period
+
+        Products not seen since the cutoff are removed. For the others the
+        version in effect at the cutoff is kept, so their history still
+        starts from a known state.
+        """
+        cutoff = time.time() - retention_days * 86400
+        params = {"cutoff": cutoff, "partition": get_partition(cutoff),
+                  "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(cutoff))}
+        with self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM products WHERE last_seen < :cutoff", params).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM product_versions WHERE partition <= :partition "
+                "AND scraped_at < :cutoff AND (asin NOT IN (SELECT asin FROM products) "
+                "OR EXISTS (SELECT 1 FROM product_versions n WHERE n.asin = "
+                "product_versions.asin AND n.scraped_at > product_versions.scraped_at "
+                "AND n.scraped_at <= :cutoff))", params).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM links WHERE timestamp < :timestamp", params).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM media WHERE timestamp < :timestamp", params).rowcount
+            self.conn.execute(
+                "DELETE FROM partitions WHERE partition < :partition AND NOT EXISTS "
+                "(SELECT 1 FROM product_versions v WHERE v.partition = partitions.partition)",
+                params)
+        return removed
+
+    def vacuum(self, full: bool = False):
+        """Return free pages to the file system and refresh the query planner statistics
+
+        The incremental vacuum only touches the freed pages; ``full``
+        rebuilds the whole file, which also defragments it.
+        """
+        if full:
+            self.conn.execute("VACUUM")
+        else:
+            self.conn.execute("PRAGMA incremental_vacuum")
+        if self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone():
+            with self.conn:
+                self.conn.execute("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+        self.conn.execute("PRAGMA optimize")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def maintain(self, compact_after_days: float = 0, retention_days: float = 0,
+                 full_vacuum: bool = False) -> Dict:
+        """Apply the compaction and retention policies (0 disables either), then vacuum"""
+        report = {"compacted": 0, "expired": 0}
+        if compact_after_days:
+            report["compacted"] = self.compact(compact_after_days)
+        if retention_days:
+            report["expired"] = self.apply_retention(retention_days)
+        self.vacuum(full_vacuum)
+        return report
+
+    def close(self):
+        self.conn.close()